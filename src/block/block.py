@@ -1,11 +1,19 @@
 from io import BytesIO
+import struct
 from time import time
 from typing import List
 
-from src.helper.helper import bits_to_target, hash256, int_to_little_endian, little_endian_to_int, merkle_root
+from src.helper.helper import Reader, Tracked, Writer, bits_to_target, hash256, merkle_root
 
+# version, prev_block, merkle_root, timestamp, bits, nonce
+HEADER = struct.Struct('<I32s32sI4s4s')
+
+
+class Block(Tracked):
+    '''Block caches its header serialization and hash, changing header fields clears them'''
+    tracked_fields = frozenset(('version', 'prev_block', 'merkle_root', 'timestamp', 'bits', 'nonce'))
+    has_cache = True
 
-class Block:
     def __init__(
             self, version: int,
             prev_block: bytes,
@@ -14,6 +22,8 @@ class Block:
             bits: bytes,
             nonce: bytes,
             tx_hashes: List[bytes] = None):
+        self.header = None
+        self.hash_cache = None
         self.version = version
         self.prev_block = prev_block
         self.merkle_root = merkle_root
@@ -38,29 +48,42 @@ class Block:
         Takes a byte stream and parses a block.
         Returns a Block object
         '''
-        version = little_endian_to_int(s.read(4))
-        prev_block = s.read(32)[::-1]
-        merkle_root = s.read(32)[::-1]
-        timestamp = little_endian_to_int(s.read(4))
-        bits = s.read(4)
-        nonce = s.read(4)
-        return cls(version, prev_block, merkle_root, timestamp, bits, nonce)
+        with Reader.of(s) as reader:
+            return cls.read(reader)
+
+    @classmethod
+    def read(cls, reader: Reader) -> 'Block':
+        header = reader.read(HEADER.size)
+        version, prev_block, merkle_root, timestamp, bits, nonce = HEADER.unpack(header)
+        block = cls(version, prev_block[::-1], merkle_root[::-1], timestamp, bits, nonce)
+        block.header = header
+        return block
+
+    def clear_cache(self) -> None:
+        self.header = None
+        self.hash_cache = None
 
     def serialize(self) -> bytes:
         '''Returns the 80 bytes Block header'''
-        result = b''
-        result += int_to_little_endian(self.version, 4)
-        result += self.prev_block[::-1]
-        result += self.merkle_root[::-1]
-        result += int_to_little_endian(self.timestamp, 4)
-        result += self.bits
-        result += self.nonce
-        return result
+        if self.header is None:
+            self.header = HEADER.pack(
+                self.version,
+                self.prev_block[::-1],
+                self.merkle_root[::-1],
+                self.timestamp,
+                self.bits,
+                self.nonce
+            )
+        return self.header
+
+    def write(self, writer: Writer) -> None:
+        writer.write(self.serialize())
 
     def hash(self) -> bytes:
         '''Returns the hash256 interpreted little endian of the Block'''
-        b = self.serialize()
-        return hash256(b)[::-1]
+        if self.hash_cache is None:
+            self.hash_cache = hash256(self.serialize())[::-1]
+        return self.hash_cache
 
     def bip9(self) -> bool:
         '''Returns whether this Block is signaling readiness for BIP0009'''
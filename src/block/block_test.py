@@ -36,6 +36,14 @@ class BlockTest(TestCase):
         block = Block.parse(stream)
         self.assertEqual(block.hash(), bytes.fromhex(
             '0000000000000000007e9e4c586439b0cdbe13b1370bdd9435d76a644d047523'))
+        self.assertIs(block.hash(), block.hash())
+        nonce = block.nonce
+        block.nonce = b'\x00' * 4
+        self.assertNotEqual(block.hash(), bytes.fromhex(
+            '0000000000000000007e9e4c586439b0cdbe13b1370bdd9435d76a644d047523'))
+        block.nonce = nonce
+        self.assertEqual(block.hash(), bytes.fromhex(
+            '0000000000000000007e9e4c586439b0cdbe13b1370bdd9435d76a644d047523'))
 
     def test_bip9(self):
         block_raw = bytes.fromhex(
@@ -1,5 +1,5 @@
 from network.messages import GenericMessage
-from src.helper.helper import bit_field_to_bytes, encode_varint,  int_to_little_endian, murmur3
+from src.helper.helper import Writer, bit_field_to_bytes, murmur3
 
 
 class BloomFilter:
@@ -20,9 +20,9 @@ class BloomFilter:
         return bit_field_to_bytes(self.bit_field)
 
     def filterload(self, flag=1) -> bytes:
-        result = encode_varint(self.size)
-        result += self.filter_bytes()
-        result += int_to_little_endian(self.function_count, 4)
-        result += int_to_little_endian(self.tweak, 4)
-        result += int_to_little_endian(flag, 1)
-        return GenericMessage(b'filterload', result)
+        writer = Writer()
+        writer.write_var_bytes(self.filter_bytes())
+        writer.write_uint32(self.function_count)
+        writer.write_uint32(self.tweak)
+        writer.write_uint8(flag)
+        return GenericMessage(b'filterload', writer.getvalue())
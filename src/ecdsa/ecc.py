@@ -2,6 +2,8 @@ from typing import Union
 
 
 class FieldElement:
+    __slots__ = ('num', 'prime')
+
     def __init__(self, num: int, prime: int):
         if num >= prime or num < 0:
             err = 'Num {} not in field range 0 to {}'.format(num, prime - 1)
@@ -57,18 +59,64 @@ class FieldElement:
         return self.__class__(num, self.prime)
 
 
+class Curve:
+    '''
+    y^2 = x^3 + a * x + b
+    Same (a, b) always returns the same Curve object,
+    so points can compare their curves by identity.
+    '''
+    __slots__ = ('a', 'b')
+    instances = {}
+
+    def __new__(cls, a: Union['FieldElement', int], b: Union['FieldElement', int]) -> 'Curve':
+        key = (cls.key(a), cls.key(b))
+        curve = cls.instances.get(key)
+        if curve is None:
+            curve = super().__new__(cls)
+            curve.a = a
+            curve.b = b
+            cls.instances[key] = curve
+        return curve
+
+    def __repr__(self) -> str:
+        return 'Curve({}, {})'.format(self.a, self.b)
+
+    @staticmethod
+    def key(value: Union['FieldElement', int]) -> tuple:
+        if isinstance(value, FieldElement):
+            return (value.num, value.prime)
+        return (value, None)
+
+
 class Point:
+    __slots__ = ('curve', 'x', 'y')
+
     def __init__(self, x: Union['FieldElement', int], y: Union['FieldElement', int], a: int, b: int):
-        self.a = a
-        self.b = b
+        self.curve = Curve(a, b)
         self.x = x
         self.y = y
 
-        if self.x is None and self.x is None:
+        if self.x is None and self.y is None:
             return
         if self.y ** 2 != self.x ** 3 + a * x + b:
             raise ValueError('({} {}) is not on the curve'.format(x, y))
 
+    @property
+    def a(self) -> Union['FieldElement', int]:
+        return self.curve.a
+
+    @property
+    def b(self) -> Union['FieldElement', int]:
+        return self.curve.b
+
+    def derive(self, x: Union['FieldElement', int], y: Union['FieldElement', int]) -> 'Point':
+        '''return point (x, y) on the same curve, without on-curve check(only for computed point)'''
+        point = object.__new__(self.__class__)
+        point.curve = self.curve
+        point.x = x
+        point.y = y
+        return point
+
     def __repr__(self) -> str:
         if self.x is None:
             return 'Point(Infinity)'
@@ -76,8 +124,8 @@ class Point:
             return 'Point({}, {})_{}_{}'.format(self.x, self.y, self.a, self.b)
 
     def __eq__(self, other: 'Point') -> bool:
-        return self.x == other.x and self.y == other.y \
-            and self.a == other.a and self.b == other.b
+        return self.curve is other.curve \
+            and self.x == other.x and self.y == other.y
         # return not (self != other)
 
     def __ne__(self, other: 'Point') -> bool:
@@ -86,22 +134,22 @@ class Point:
         #     or self.a != other.a or self.b != other.b
 
     def __add__(self, other: 'Point') -> 'Point':
-        if self.a != other.a or self.b != other.b:
+        if self.curve is not other.curve:
             raise TypeError('Cannot add two points in different Curves')
-        if self.x == None:
-            return self.__class__(other.x, other.y, other.a, other.b)
-        if other.x == None:
-            return self.__class__(self.x, self.y, self.a, self.b)
+        if self.x is None:
+            return self.derive(other.x, other.y)
+        if other.x is None:
+            return self.derive(self.x, self.y)
         if self.x == other.x and self.y != other.y:
-            return self.__class__(None, None, self.a, self.b)
+            return self.derive(None, None)
         s: int
         if self.x == other.x and self.y == other.y:
-            s = (3 * self.x ** 2 + self.a) / (2 * self.y)
+            s = (3 * self.x ** 2 + self.curve.a) / (2 * self.y)
         else:
             s = (other.y - self.y) / (other.x - self.x)
         x3 = s ** 2 - self.x - other.x
         y3 = s * (self.x - x3) - self.y
-        return self.__class__(x3, y3, self.a, self.b)
+        return self.derive(x3, y3)
 
     # * (for __rmul__)
     # * It's very intuitive implementation.
@@ -116,7 +164,7 @@ class Point:
     def __rmul__(self, coefficient: int) -> 'Point':
         coef = coefficient
         current = self
-        result = self.__class__(None, None, self.a, self.b)
+        result = self.derive(None, None)
 
         while coef:
             if coef & 1:
@@ -1,6 +1,6 @@
 from unittest import TestCase
 
-from src.ecdsa.ecc import (FieldElement, Point)
+from src.ecdsa.ecc import (Curve, FieldElement, Point)
 
 
 class FieldElementTest(TestCase):
@@ -71,6 +71,17 @@ class PointTest(TestCase):
         b = Point(x=-1, y=-1, a=5, b=7)
         self.assertEqual(a + b, Point(x=2, y=-5, a=5, b=7))
 
+    def test_curve(self):
+        a = Point(x=-1, y=-1, a=5, b=7)
+        b = Point(x=18, y=77, a=5, b=7)
+        self.assertIs(a.curve, b.curve)
+        self.assertIs(Curve(5, 7), a.curve)
+        self.assertIsNot(Curve(5, 8), a.curve)
+        self.assertEqual((a.a, a.b), (5, 7))
+        c = Point(x=None, y=None, a=5, b=8)
+        with self.assertRaises(TypeError):
+            a + c
+
     def test_add2(self):
         a = Point(x=-1, y=-1, a=5, b=7)
         self.assertEqual(a + a, Point(x=18, y=77, a=5, b=7))
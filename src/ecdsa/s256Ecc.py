@@ -3,10 +3,17 @@
 
 import hashlib
 import hmac
+from logging import getLogger
+import mmap
+import os
+import struct
+from typing import Iterator, List, Tuple
 
 from src.ecdsa import ecc
 from src.helper import helper
 
+LOGGER = getLogger(__name__)
+
 
 # Bit Coin's Descrete Elliptic Curve Variables
 A: int = 0  # Elliptic Curve variable 1
@@ -17,10 +24,332 @@ N = 0xfffffffffffffffffffffffffffffffebaaedce6af48a03bbfd25e8cd0364141  # Group'
 Gx: int = 0x79be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798
 # y of Group's representative
 Gy: int = 0x483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8
+# Endomorphism(GLV): LAMBDA * (x, y) = (BETA * x, y)
+LAMBDA: int = 0x5363ad4cc05c30e0a5261c028812645a122e22ea20816678df02967c1b23bd72
+BETA: int = 0x7ae96a2b657c07106e64479eac3434e99cf0497512f58995c1396c28719501ee
+# short basis of lattice {(a, b) | a + b * LAMBDA = 0 (mod N)} for splitting scalar
+GLV_A1: int = 0x3086d221a7d46bcde86c90e49284eb15
+GLV_B1: int = -0xe4437ed6010e88286f547fa90abfe4c3
+GLV_A2: int = 0x114ca50f7a8e2f3f657c1108d9d44cfd8
+GLV_B2: int = GLV_A1
+# use GLV for multiplying the point which is not G
+USE_GLV = True
+
+
+# Jacobian(projective) coordinates
+# (X, Y, Z) means affine point (X / Z^2, Y / Z^3). Z == 0 is point at infinity.
+# Every operation works on raw int, so there is no inversion until to_affine.
+INFINITY = (0, 1, 0)
+
+
+def jacobian_double(p1: tuple) -> tuple:
+    '''return 2 * p1 (secp256k1 has a = 0)'''
+    x1, y1, z1 = p1
+    if not z1 or not y1:
+        return INFINITY
+    yy = y1 * y1 % P
+    s = 4 * x1 * yy % P
+    m = 3 * x1 * x1 % P
+    x3 = (m * m - 2 * s) % P
+    y3 = (m * (s - x3) - 8 * yy * yy) % P
+    z3 = 2 * y1 * z1 % P
+    return (x3, y3, z3)
+
+
+def jacobian_add(p1: tuple, p2: tuple) -> tuple:
+    '''return p1 + p2'''
+    x1, y1, z1 = p1
+    x2, y2, z2 = p2
+    if not z1:
+        return p2
+    if not z2:
+        return p1
+    z1z1 = z1 * z1 % P
+    # p2 is affine(z2 == 1) in most cases (ex. precomputed table)
+    if z2 == 1:
+        u1 = x1
+        s1 = y1
+    else:
+        z2z2 = z2 * z2 % P
+        u1 = x1 * z2z2 % P
+        s1 = y1 * z2 * z2z2 % P
+    u2 = x2 * z1z1 % P
+    s2 = y2 * z1 * z1z1 % P
+    h = (u2 - u1) % P
+    r = (s2 - s1) % P
+    if not h:
+        if not r:
+            return jacobian_double(p1)
+        return INFINITY
+    hh = h * h % P
+    hhh = h * hh % P
+    v = u1 * hh % P
+    x3 = (r * r - hhh - 2 * v) % P
+    y3 = (r * (v - x3) - s1 * hhh) % P
+    z3 = h * z1 * z2 % P
+    return (x3, y3, z3)
+
+
+def jacobian_multiply(p1: tuple, coefficient: int) -> tuple:
+    '''return coefficient * p1 (double-and-add from the top bit)'''
+    result = INFINITY
+    for bit in bin(coefficient)[2:]:
+        result = jacobian_double(result)
+        if bit == '1':
+            result = jacobian_add(result, p1)
+    return result
+
+
+def jacobian_negate(p1: tuple) -> tuple:
+    '''return -p1'''
+    x1, y1, z1 = p1
+    return (x1, (P - y1) % P, z1)
+
+
+def wnaf(coefficient: int, width: int) -> list:
+    '''
+    return width-NAF digits of coefficient (least significant digit first)
+    every non-zero digit is odd and in range -2^(width-1) < digit < 2^(width-1)
+    '''
+    digits = []
+    while coefficient:
+        if coefficient & 1:
+            digit = coefficient & ((1 << width) - 1)
+            if digit >= 1 << (width - 1):
+                digit -= 1 << width
+            coefficient -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        coefficient >>= 1
+    return digits
+
+
+def odd_multiples(p1: tuple, width: int) -> list:
+    '''return [1 * p1, 3 * p1, 5 * p1, ..., (2^(width-1) - 1) * p1]'''
+    result = [p1]
+    double = jacobian_double(p1)
+    for _ in range((1 << (width - 2)) - 1):
+        result.append(jacobian_add(result[-1], double))
+    return result
+
+
+def jacobian_multi_multiply(terms: list) -> tuple:
+    '''
+    terms: [(coefficient, odd_multiples of point, width), ...]
+    return sum of coefficient * point. (Strauss-Shamir with interleaved wNAF)
+    All terms share one run of doublings. coefficient can be negative.
+    '''
+    nafs = []
+    for coefficient, table, width in terms:
+        if coefficient < 0:
+            naf = [-digit for digit in wnaf(-coefficient, width)]
+        else:
+            naf = wnaf(coefficient, width)
+        nafs.append((naf, table))
+    length = max(len(naf) for naf, _ in nafs)
+    result = INFINITY
+    for i in range(length - 1, -1, -1):
+        result = jacobian_double(result)
+        for naf, table in nafs:
+            if i >= len(naf):
+                continue
+            digit = naf[i]
+            if digit > 0:
+                result = jacobian_add(result, table[digit >> 1])
+            elif digit < 0:
+                result = jacobian_add(result, jacobian_negate(table[-digit >> 1]))
+    return result
+
+
+def endomorphism(p1: tuple) -> tuple:
+    '''return LAMBDA * p1, it only costs one multiplication'''
+    x1, y1, z1 = p1
+    return (BETA * x1 % P, y1, z1)
+
+
+def glv_split(coefficient: int) -> tuple:
+    '''
+    return (k1, k2) which satisfy k1 + k2 * LAMBDA = coefficient (mod N)
+    k1 and k2 are about 128 bits, and they can be negative.
+    '''
+    c1 = (2 * GLV_B2 * coefficient + N) // (2 * N)
+    c2 = (-2 * GLV_B1 * coefficient + N) // (2 * N)
+    k1 = coefficient - c1 * GLV_A1 - c2 * GLV_A2
+    k2 = -c1 * GLV_B1 - c2 * GLV_B2
+    return k1, k2
+
+
+def glv_terms(coefficient: int, table: list, width: int, endo_table: list = None) -> list:
+    '''
+    return 2 terms for jacobian_multi_multiply which make coefficient * point
+    table is odd multiples of point, endo_table is LAMBDA * table.
+    '''
+    if endo_table is None:
+        endo_table = [endomorphism(p1) for p1 in table]
+    k1, k2 = glv_split(coefficient)
+    return [(k1, table, width), (k2, endo_table, width)]
+
+
+def pippenger(pairs: list) -> tuple:
+    '''
+    pairs: [(coefficient, jacobian point), ...], coefficient can be negative.
+    return sum of coefficient * point (Pippenger's bucket method)
+    It is faster than jacobian_multi_multiply when there are many points,
+    and the number of windows depends on the longest coefficient.
+    '''
+    targets = []
+    for coefficient, p1 in pairs:
+        if coefficient < 0:
+            coefficient, p1 = -coefficient, jacobian_negate(p1)
+        if coefficient and p1[2]:
+            targets.append((coefficient, p1))
+    if not targets:
+        return INFINITY
+    pairs = targets
+    bits = max(coefficient.bit_length() for coefficient, _ in pairs)
+    width = max(2, len(pairs).bit_length() - 2)
+    mask = (1 << width) - 1
+    result = INFINITY
+    for shift in range(((bits - 1) // width) * width, -1, -width):
+        for _ in range(width):
+            result = jacobian_double(result)
+        buckets = [INFINITY] * (mask + 1)
+        for coefficient, p1 in pairs:
+            digit = (coefficient >> shift) & mask
+            if digit:
+                buckets[digit] = jacobian_add(buckets[digit], p1)
+        # sum of digit * buckets[digit] = sum of running sums from the top bucket
+        running = INFINITY
+        total = INFINITY
+        for bucket in reversed(buckets[1:]):
+            running = jacobian_add(running, bucket)
+            total = jacobian_add(total, running)
+        result = jacobian_add(result, total)
+    return result
+
+
+def to_affine(p1: tuple) -> tuple:
+    '''return (x, y) of p1, (None, None) if p1 is point at infinity'''
+    x1, y1, z1 = p1
+    if not z1:
+        return None, None
+    z_inv = pow(z1, P - 2, P)
+    z_inv2 = z_inv * z_inv % P
+    return x1 * z_inv2 % P, y1 * z_inv2 * z_inv % P
+
+
+def batch_inverse(values: list, modulus: int) -> list:
+    '''
+    return inverse of every value(must not be 0) with only one pow.
+    (Montgomery's trick)
+    '''
+    prefix = []
+    acc = 1
+    for value in values:
+        prefix.append(acc)
+        acc = acc * value % modulus
+    inv = pow(acc, modulus - 2, modulus)
+    result = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        result[i] = prefix[i] * inv % modulus
+        inv = inv * values[i] % modulus
+    return result
+
+
+def batch_normalize(points: list) -> list:
+    '''
+    return affine version (x, y, 1) of every jacobian point.
+    All points are converted with only one inversion(batch_inverse).
+    point at infinity stays INFINITY.
+    '''
+    targets = [p1 for p1 in points if p1[2]]
+    z_invs = iter(batch_inverse([p1[2] for p1 in targets], P))
+    result = []
+    for x1, y1, z1 in points:
+        if not z1:
+            result.append(INFINITY)
+            continue
+        z_inv = next(z_invs)
+        z_inv2 = z_inv * z_inv % P
+        result.append((x1 * z_inv2 % P, y1 * z_inv2 * z_inv % P, 1))
+    return result
+
+
+# Fixed-base table for G
+# G_TABLE[i][d] = d * 2^(G_WINDOW * i) * G (affine, z = 1)
+# so coefficient * G is only the sum of one entry per window. (no doubling)
+G_WINDOW = 4
+G_TABLE = None
+
+
+def g_table() -> list:
+    '''return G_TABLE, it is built(or loaded from TABLE_FILE) at first use'''
+    global G_TABLE
+    if G_TABLE is None:
+        load_table_file()
+    if G_TABLE is None:
+        points = []
+        base = (Gx, Gy, 1)
+        windows = (256 + G_WINDOW - 1) // G_WINDOW
+        for _ in range(windows):
+            current = base
+            for _ in range(1, 1 << G_WINDOW):
+                points.append(current)
+                current = jacobian_add(current, base)
+            # current is 2^G_WINDOW * base now.
+            base = current
+        points = batch_normalize(points)
+        size = (1 << G_WINDOW) - 1
+        G_TABLE = [[INFINITY] + points[i * size:(i + 1) * size] for i in range(windows)]
+    return G_TABLE
+
+
+def g_multiply(coefficient: int) -> tuple:
+    '''return coefficient * G using G_TABLE'''
+    table = g_table()
+    mask = (1 << G_WINDOW) - 1
+    result = INFINITY
+    i = 0
+    while coefficient:
+        digit = coefficient & mask
+        if digit:
+            result = jacobian_add(result, table[i][digit])
+        coefficient >>= G_WINDOW
+        i += 1
+    return result
+
+
+# odd multiples of G for jacobian_multi_multiply (affine, z = 1)
+G_WNAF_WIDTH = 8
+G_ODD_MULTIPLES = None
+G_ODD_MULTIPLES_ENDO = None
+# width for the point which is not known before (ex. public key)
+WNAF_WIDTH = 5
+
+
+def g_odd_multiples() -> list:
+    '''return G_ODD_MULTIPLES, it is built(or loaded from TABLE_FILE) at first use'''
+    global G_ODD_MULTIPLES
+    if G_ODD_MULTIPLES is None:
+        load_table_file()
+    if G_ODD_MULTIPLES is None:
+        G_ODD_MULTIPLES = batch_normalize(odd_multiples((Gx, Gy, 1), G_WNAF_WIDTH))
+    return G_ODD_MULTIPLES
+
+
+def g_odd_multiples_endo() -> list:
+    '''return G_ODD_MULTIPLES_ENDO(LAMBDA * G_ODD_MULTIPLES), it is built at first use'''
+    global G_ODD_MULTIPLES_ENDO
+    if G_ODD_MULTIPLES_ENDO is None:
+        G_ODD_MULTIPLES_ENDO = [endomorphism(p1) for p1 in g_odd_multiples()]
+    return G_ODD_MULTIPLES_ENDO
 
 
 # secp256k1 Group Field
 class S256Field(ecc.FieldElement):
+    __slots__ = ()
+
     def __init__(self, num: int, p=None):
         super().__init__(num, P)
 
@@ -30,16 +359,73 @@ class S256Field(ecc.FieldElement):
     def sqrt(self):
         return self**((P + 1) // 4)
 
+    @classmethod
+    def unchecked(cls, num: int) -> 'S256Field':
+        '''make S256Field without range check, num must be in 0 ~ P - 1'''
+        element = cls.__new__(cls)
+        element.num = num
+        element.prime = P
+        return element
+
+
+FIELD_A = S256Field(A)
+FIELD_B = S256Field(B)
+CURVE = ecc.Curve(FIELD_A, FIELD_B)
+
+
+def lift_x(x: int, is_even: bool) -> int:
+    '''return y of the point which has x, raise ValueError if there is no point'''
+    y_square = (pow(x, 3, P) + B) % P
+    y = pow(y_square, (P + 1) // 4, P)
+    if y * y % P != y_square:
+        raise ValueError('x({:x}) is not on the curve'.format(x))
+    if (y % 2 == 0) != is_even:
+        y = P - y
+    return y
+
+
+# parsed public keys (SEC bytes -> S256Point), set SEC_CACHE.resize(n) to change the limit.
+SEC_CACHE_SIZE = 4096
+SEC_CACHE = helper.LRUCache(SEC_CACHE_SIZE)
+
 
 # TODO: Now S256Point have Public Key's logic. So, seperate that methods.
 # secp256k1 Elliptic Curve Point
+# Arithmetic is done on raw int(jacobian_*), S256Point is only for API boundary.
 class S256Point(ecc.Point):
+    # tables: precomputed odd multiples for multiplying this point (see wnaf_tables)
+    __slots__ = ('tables',)
+
     def __init__(self, x: int, y: int, a=None, b=None):
-        a, b = S256Field(A), S256Field(B)
-        if type(x) == int:
-            super().__init__(S256Field(x), S256Field(y), a, b)
+        if isinstance(x, ecc.FieldElement):
+            x, y = x.num, y.num
+        self.curve = CURVE
+        self.tables = None
+        if x is None:
+            self.x = self.y = None
+            return
+        if not (0 <= x < P and 0 <= y < P) or (y * y - x * x * x - B) % P:
+            raise ValueError('({:x} {:x}) is not on the curve'.format(x, y))
+        self.x = S256Field.unchecked(x)
+        self.y = S256Field.unchecked(y)
+
+    @classmethod
+    def unchecked(cls, x: int, y: int) -> 'S256Point':
+        '''make S256Point without on-curve check, only for the point derived internally'''
+        point = cls.__new__(cls)
+        point.curve = CURVE
+        point.tables = None
+        if x is None:
+            point.x = point.y = None
         else:
-            super().__init__(x, y, a, b)
+            point.x = S256Field.unchecked(x)
+            point.y = S256Field.unchecked(y)
+        return point
+
+    def derive(self, x: S256Field, y: S256Field) -> 'S256Point':
+        if x is None:
+            return self.unchecked(None, None)
+        return self.unchecked(x.num, y.num)
 
     def __repr__(self):
         if self.x is None:
@@ -47,17 +433,72 @@ class S256Point(ecc.Point):
         else:
             return 'S256Point({}, {})'.format(self.x, self.y)
 
+    def __add__(self, other: 'S256Point') -> 'S256Point':
+        return self.from_jacobian(jacobian_add(self.to_jacobian(), other.to_jacobian()))
+
     def __rmul__(self, coefficient: int) -> 'S256Point':
         coef = coefficient % N
-        return super().__rmul__(coef)
+        if coef == 0 or self.x is None:
+            return self.unchecked(None, None)
+        if self.x.num == Gx and self.y.num == Gy:
+            return self.from_jacobian(g_multiply(coef))
+        table, endo_table = self.wnaf_tables()
+        if USE_GLV:
+            terms = glv_terms(coef, table, WNAF_WIDTH, endo_table)
+        else:
+            terms = [(coef, table, WNAF_WIDTH)]
+        return self.from_jacobian(jacobian_multi_multiply(terms))
+
+    def wnaf_tables(self) -> tuple:
+        '''
+        return (odd multiples of self, LAMBDA * odd multiples) for jacobian_multi_multiply.
+        They are kept on this point, and normalized when the point is used again.
+        (ex. public key from SEC_CACHE)
+        '''
+        if self.tables is None:
+            table = odd_multiples(self.to_jacobian(), WNAF_WIDTH)
+        elif self.tables[0][-1][2] != 1:
+            table = batch_normalize(self.tables[0])
+        else:
+            return self.tables
+        self.tables = (table, [endomorphism(p1) for p1 in table])
+        return self.tables
+
+    def to_jacobian(self) -> tuple:
+        if self.x is None:
+            return INFINITY
+        return (self.x.num, self.y.num, 1)
+
+    @classmethod
+    def from_jacobian(cls, p1: tuple) -> 'S256Point':
+        x, y = to_affine(p1)
+        return cls.unchecked(x, y)
 
     # It only work well when this point is Public Key.
     def verify(self, z: bytes, sig: 'Signature') -> bool:
         s_inv = pow(sig.s, N - 2, N)
+        return self.verify_with_s_inv(z, sig.r, s_inv)
+
+    def g_point_multiply(self, u: int, v: int) -> tuple:
+        '''return u * G + v * self (jacobian) with one run of doublings'''
+        table, endo_table = self.wnaf_tables()
+        if USE_GLV:
+            # 4 terms of 128 bits, so the number of doublings is halved.
+            terms = glv_terms(u, g_odd_multiples(), G_WNAF_WIDTH, g_odd_multiples_endo()) \
+                + glv_terms(v, table, WNAF_WIDTH, endo_table)
+        else:
+            terms = [(u, g_odd_multiples(), G_WNAF_WIDTH), (v, table, WNAF_WIDTH)]
+        return jacobian_multi_multiply(terms)
+
+    def verify_with_s_inv(self, z: int, r: int, s_inv: int) -> bool:
+        '''verify with already inverted s (s_inv = s^-1 mod N)'''
         u = z * s_inv % N
-        v = sig.r * s_inv % N
-        result = (u * G) + (v * self)
-        return result.x.num == sig.r
+        v = r * s_inv % N
+        x, _, z1 = self.g_point_multiply(u, v)
+        # compare in jacobian coordinates (x / z1^2 == r), no inversion needed.
+        if not z1 or r >= P:
+            return False
+        return x == r * z1 * z1 % P
 
     # For Point Serialization
     # SEC(Stanadrds for Efficient Cryptography)
@@ -72,27 +513,42 @@ class S256Point(ecc.Point):
 
     @classmethod
     def parse_sec(cls, sec_bin: bytes) -> 'S256Point':
-        '''return S256Point(PublicKey) from SEC Binary'''
+        '''
+        return S256Point(PublicKey) from SEC Binary
+        Same keys are parsed again and again in scripts, so parsed point is kept in SEC_CACHE.
+        '''
+        sec_bin = bytes(sec_bin)
+        point = SEC_CACHE.get(sec_bin)
+        if point is None:
+            point = cls.decode_sec(sec_bin)
+            SEC_CACHE.put(sec_bin, point)
+        return point
+
+    @classmethod
+    def decode_sec(cls, sec_bin: bytes) -> 'S256Point':
+        '''return S256Point(PublicKey) from SEC Binary without SEC_CACHE'''
         # uncompressed
         if sec_bin[0] == 4:
             x = int.from_bytes(sec_bin[1:33], 'big')
             y = int.from_bytes(sec_bin[33:65], 'big')
             return cls(x, y)
         # compressed
-        x = S256Field(int.from_bytes(sec_bin[1:], 'big'))
-        y_square: S256Field = x ** 3 + S256Field(B)
-        y_candidate = y_square.sqrt()
-        if y_candidate.num % 2 == 0:
-            even_y = y_candidate.num
-            odd_y = S256Field(P - y_candidate.num)
-        else:
-            even_y = S256Field(P - y_candidate.num)
-            odd_y = y_candidate.num
-        is_even = sec_bin[0] == 2
-        if is_even:
-            return cls(x, even_y)
-        else:
-            return cls(x, odd_y)
+        x = int.from_bytes(sec_bin[1:], 'big')
+        if x >= P:
+            raise ValueError('x({:x}) is not in field range'.format(x))
+        return cls.unchecked(x, lift_x(x, sec_bin[0] == 2))
+
+    # x-only public key (BIP340), y is always even.
+    def serialize_xonly(self) -> bytes:
+        return self.x.num.to_bytes(32, 'big')
+
+    @classmethod
+    def parse_xonly(cls, xonly_bin: bytes) -> 'S256Point':
+        '''return S256Point(PublicKey) which has even y from 32 bytes x'''
+        if len(xonly_bin) != 32:
+            raise ValueError('x-only public key must be 32 bytes')
+        # it is same with compressed SEC of even y
+        return cls.parse_sec(b'\x02' + bytes(xonly_bin))
 
     def hash160(self, compressed=True) -> bytes:
         return helper.hash160(self.serialize_sec(compressed))
@@ -106,10 +562,183 @@ class S256Point(ecc.Point):
             prefix = b'\x00'
         return helper.encode_base58_checksum(prefix + h160)
 
+    def p2wpkh_address(self, testnet=False) -> str:
+        '''Return the native segwit(v0) address string of compressed key'''
+        return helper.h160_to_p2wpkh_address(self.hash160(True), testnet)
+
 
 G = S256Point(Gx, Gy)
 
 
+def verify_batch(items: list) -> list:
+    '''
+    items: [(public key(S256Point), z, Signature), ...]
+    return [whether the signature is valid, ...] (same order with items)
+    All s are inverted together and no item needs an inversion of its own.
+    '''
+    results = [False] * len(items)
+    targets = [idx for idx, (_, _, sig) in enumerate(items) if sig.s % N]
+    s_invs = batch_inverse([items[idx][2].s for idx in targets], N)
+    for idx, s_inv in zip(targets, s_invs):
+        point, z, sig = items[idx]
+        results[idx] = point.verify_with_s_inv(z, sig.r, s_inv)
+    return results
+
+
+# Persistent precomputation tables
+# Building tables in every short-lived process(ex. verification pool worker) is slow,
+# so they can be saved once with save_tables and loaded with load_tables.
+# If S256_TABLE_FILE environment variable is set, the file is loaded at first use.
+TABLE_FILE = os.environ.get('S256_TABLE_FILE')
+TABLE_MAGIC = b'S256'
+TABLE_VERSION = 1
+# magic, version, G_WINDOW, G_WNAF_WIDTH, WNAF_WIDTH, number of public keys
+TABLE_HEADER = struct.Struct('<4sBBBBI')
+POINT_SIZE = 64
+
+
+def save_tables(filename: str, points: List[S256Point] = ()) -> None:
+    '''
+    Save G_TABLE, G_ODD_MULTIPLES and wnaf tables of points(ex. hot public keys).
+    format: header | points(x, y: 32 bytes big endian) | sha256 checksum(32 bytes)
+    '''
+    body = bytearray(TABLE_HEADER.pack(
+        TABLE_MAGIC, TABLE_VERSION, G_WINDOW, G_WNAF_WIDTH, WNAF_WIDTH, len(points)))
+    for row in g_table():
+        for x, y, _ in row[1:]:
+            body += x.to_bytes(32, 'big') + y.to_bytes(32, 'big')
+    for x, y, _ in g_odd_multiples():
+        body += x.to_bytes(32, 'big') + y.to_bytes(32, 'big')
+    for point in points:
+        body += point.serialize_sec(compressed=False)[1:]
+        for x, y, _ in batch_normalize(point.wnaf_tables()[0]):
+            body += x.to_bytes(32, 'big') + y.to_bytes(32, 'big')
+    body += hashlib.sha256(body).digest()
+    with open(filename, 'wb') as f:
+        f.write(body)
+
+
+def load_table_file() -> None:
+    '''
+    Load TABLE_FILE at first use of the tables.
+    Broken or old file is ignored(only once), then tables are built instead.
+    '''
+    global TABLE_FILE
+    if not TABLE_FILE or not os.path.exists(TABLE_FILE):
+        return
+    try:
+        load_tables(TABLE_FILE)
+    except (ValueError, OSError) as e:
+        LOGGER.warning('table file is not used: {}'.format(e))
+        TABLE_FILE = None
+
+
+def load_tables(filename: str) -> List[S256Point]:
+    '''
+    Load tables saved by save_tables(file is memory-mapped and checked by its checksum).
+    G_TABLE and G_ODD_MULTIPLES are replaced, and public keys are put in SEC_CACHE
+    with their tables. Returns the loaded public keys.
+    '''
+    global G_TABLE, G_ODD_MULTIPLES, G_ODD_MULTIPLES_ENDO
+    with open(filename, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                if len(view) < TABLE_HEADER.size + 32 \
+                        or hashlib.sha256(view[:-32]).digest() != view[-32:]:
+                    raise ValueError('table file is broken: {}'.format(filename))
+                magic, version, window, g_width, width, count = TABLE_HEADER.unpack_from(view)
+                if (magic, version, window, g_width, width) != \
+                        (TABLE_MAGIC, TABLE_VERSION, G_WINDOW, G_WNAF_WIDTH, WNAF_WIDTH):
+                    raise ValueError('table file has different parameters: {}'.format(filename))
+
+                def read_points(offset: int, n: int) -> list:
+                    result = []
+                    for i in range(offset, offset + n * POINT_SIZE, POINT_SIZE):
+                        x = int.from_bytes(view[i:i + 32], 'big')
+                        y = int.from_bytes(view[i + 32:i + POINT_SIZE], 'big')
+                        result.append((x, y, 1))
+                    return result
+
+                offset = TABLE_HEADER.size
+                windows = (256 + G_WINDOW - 1) // G_WINDOW
+                size = (1 << G_WINDOW) - 1
+                table = []
+                for _ in range(windows):
+                    table.append([INFINITY] + read_points(offset, size))
+                    offset += size * POINT_SIZE
+                g_odd = read_points(offset, 1 << (G_WNAF_WIDTH - 2))
+                offset += len(g_odd) * POINT_SIZE
+                points = []
+                table_size = 1 << (WNAF_WIDTH - 2)
+                for _ in range(count):
+                    (x, y, _), = read_points(offset, 1)
+                    point = S256Point(x, y)
+                    odd = read_points(offset + POINT_SIZE, table_size)
+                    point.tables = (odd, [endomorphism(p1) for p1 in odd])
+                    points.append(point)
+                    offset += (table_size + 1) * POINT_SIZE
+                if offset != len(view) - 32:
+                    raise ValueError('table file has wrong length: {}'.format(filename))
+    G_TABLE = table
+    G_ODD_MULTIPLES = g_odd
+    G_ODD_MULTIPLES_ENDO = None
+    for point in points:
+        SEC_CACHE.put(point.serialize_sec(True), point)
+        SEC_CACHE.put(point.serialize_sec(False), point)
+    return points
+
+
+class SignatureCache:
+    '''
+    Remember valid (public key, z, signature), so the same signature is verified only once.
+    (ex. verified at mempool entry and verified again when its block arrives.)
+    Only valid results are kept, and the key is a salted hash of the triple,
+    so nobody can fill the cache or make collisions on purpose.
+    '''
+    # approximate memory for one entry (32 bytes digest + dict node)
+    ENTRY_SIZE = 160
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.salt = os.urandom(32)
+        self.cache = helper.LRUCache(max_bytes // self.ENTRY_SIZE)
+
+    def __repr__(self) -> str:
+        return 'SignatureCache({}/{}, hits: {}, misses: {})'.format(
+            len(self.cache), self.cache.max_size, self.hits, self.misses)
+
+    @property
+    def hits(self) -> int:
+        return self.cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self.cache.misses
+
+    def key(self, sec: bytes, z: int, der: bytes) -> bytes:
+        h = hashlib.sha256(self.salt)
+        h.update(helper.encode_varint(len(sec)))
+        h.update(sec)
+        h.update(helper.encode_varint(len(der)))
+        h.update(der)
+        h.update('{:x}'.format(z).encode('ascii'))
+        return h.digest()
+
+    def contains(self, sec: bytes, z: int, der: bytes) -> bool:
+        return self.cache.get(self.key(sec, z, der)) is not None
+
+    def add(self, sec: bytes, z: int, der: bytes) -> None:
+        self.cache.put(self.key(sec, z, der), True)
+
+    def resize(self, max_bytes: int) -> None:
+        self.cache.resize(max_bytes // self.ENTRY_SIZE)
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+
+SIG_CACHE = SignatureCache()
+
+
 class Signature:
     def __init__(self, r: int, s: int):
         self.r = r
@@ -157,39 +786,98 @@ class Signature:
 class PrivateKey:
     def __init__(self, secret: int):
         self.secret = secret
-        self.point = secret * G
+        # public key is computed at first access of point. (signing does not need it)
+        self._point = None
+        # HMAC state of deterministic_k which is same for every z (see deterministic_k)
+        self.hmac_prefix = None
+
+    @property
+    def point(self) -> S256Point:
+        '''public key (secret * G)'''
+        if self._point is None:
+            self._point = self.secret * G
+        return self._point
 
     def hex(self) -> str:
         return '{:x}'.format(self.secret).zfill(64)
 
+    @classmethod
+    def parse_hex(cls, s: str) -> 'PrivateKey':
+        '''return PrivateKey from hex(), public key is not computed'''
+        return cls(int(s, 16))
+
+    @classmethod
+    def parse_wif(cls, s: str) -> 'PrivateKey':
+        '''return PrivateKey from wif(), public key is not computed'''
+        data = helper.decode_base58_checksum(s)
+        if data[0] not in (0x80, 0xef):
+            raise ValueError('unknown wif prefix: {:x}'.format(data[0]))
+        if len(data) == 34 and data[-1] == 1:
+            data = data[:-1]
+        if len(data) != 33:
+            raise ValueError('wif has wrong length: {}'.format(len(data)))
+        return cls(int.from_bytes(data[1:], 'big'))
+
     def sign(self, z: bytes) -> 'Signature':
         k = self.deterministic_k(z)
-        r = (k * G).x.num
+        r, _ = to_affine(g_multiply(k))
         k_inv = pow(k, N - 2, N)
         s = (z + r * self.secret) * k_inv % N
         if s > N / 2:
             s = N - s
         return Signature(r, s)
 
+    def sign_many(self, zs: list) -> list:
+        '''
+        return [self.sign(z) for z in zs], but much faster.
+        All R(k * G) are normalized with one inversion mod P,
+        and all k are inverted with one inversion mod N.
+        '''
+        ks = [self.deterministic_k(z) for z in zs]
+        rs = batch_normalize([g_multiply(k) for k in ks])
+        k_invs = batch_inverse(ks, N)
+        result = []
+        for z, (r, _, _), k_inv in zip(zs, rs, k_invs):
+            s = (z + r * self.secret) * k_inv % N
+            if s > N / 2:
+                s = N - s
+            result.append(Signature(r, s))
+        return result
+
     def deterministic_k(self, z: int) -> int:
-        k = b'\x00' * 32  # key
-        v = b'\x01' * 32  # value
+        '''
+        RFC6979 HMAC-DRBG.
+        Each HMAC key is set up once and copied for the messages which use it.
+        '''
         if z > N:
             z -= N
         z_bytes = z.to_bytes(32, 'big')
         secret_bytes = self.secret.to_bytes(32, 'big')
         s256 = hashlib.sha256
-        k = hmac.new(k, v + b'\x00' + secret_bytes + z_bytes, s256).digest()
-        v = hmac.new(k, v, s256).digest()
-        k = hmac.new(k, v + b'\x01' + secret_bytes + z_bytes, s256).digest()
-        v = hmac.new(k, v, s256).digest()
+
+        def mac(key: hmac.HMAC, msg: bytes) -> bytes:
+            h = key.copy()
+            h.update(msg)
+            return h.digest()
+
+        v = b'\x01' * 32  # value
+        # key(0x00 * 32) and the message before z never change for this private key.
+        if self.hmac_prefix is None:
+            self.hmac_prefix = hmac.new(b'\x00' * 32, v + b'\x00' + secret_bytes, s256)
+        k = mac(self.hmac_prefix, z_bytes)
+        key = hmac.new(k, None, s256)
+        v = mac(key, v)
+        k = mac(key, v + b'\x01' + secret_bytes + z_bytes)
+        key = hmac.new(k, None, s256)
+        v = mac(key, v)
         while True:
-            v = hmac.new(k, v, s256).digest()
+            v = mac(key, v)
             candidate = int.from_bytes(v, 'big')
             if candidate >= 1 and candidate < N:
                 return candidate
-            k = hmac.new(k, v + b'\x00', s256).digest()
-            v = hmac.new(k, v, s256).digest()
+            k = mac(key, v + b'\x00')
+            key = hmac.new(k, None, s256)
+            v = mac(key, v)
 
     def wif(self, compressed=True, testnet=False) -> str:
         result: bytes
@@ -202,3 +890,33 @@ class PrivateKey:
         if compressed:
             result += b'\x01'
         return helper.encode_base58_checksum(result)
+
+
+def derive_keys(start: int, count: int, step: int = 1, compressed=True, testnet=False,
+                chunk_size: int = 1024) -> Iterator[Tuple[int, bytes, bytes, str]]:
+    '''
+    yield (secret, sec, hash160, address) of secret = start, start + step, ...(count keys)
+    Next public key is made by adding step * G to the previous one (no multiplication),
+    and each chunk of points is converted to affine with one inversion(batch_normalize).
+    '''
+    current = g_multiply(start % N)
+    x, y = to_affine(g_multiply(step % N))
+    step_point = (x, y, 1) if x is not None else INFINITY
+    secret = start
+    while count > 0:
+        size = min(chunk_size, count)
+        points = []
+        for _ in range(size):
+            points.append(current)
+            current = jacobian_add(current, step_point)
+        for x, y, z in batch_normalize(points):
+            if not z:
+                raise ValueError('secret {} has no public key'.format(secret))
+            if compressed:
+                sec = bytes([2 + (y & 1)]) + x.to_bytes(32, 'big')
+            else:
+                sec = b'\x04' + x.to_bytes(32, 'big') + y.to_bytes(32, 'big')
+            h160 = helper.hash160(sec)
+            yield secret, sec, h160, helper.h160_to_p2pkh_address(h160, testnet)
+            secret += step
+        count -= size
@@ -1,8 +1,16 @@
 
+from hashlib import sha256
+import os
 from random import randint
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 
-from src.ecdsa.s256Ecc import (Signature, PrivateKey, S256Point, N, G)
+from src.ecdsa import ecc, s256Ecc
+from src.ecdsa.s256Ecc import (
+    S256Field, Signature, PrivateKey, S256Point, N, G, g_multiply, jacobian_multiply,
+    jacobian_multi_multiply, odd_multiples, wnaf, batch_inverse, verify_batch,
+    glv_split, endomorphism, BETA, LAMBDA, P, Gx, Gy, batch_normalize, INFINITY,
+    derive_keys, save_tables, load_tables, pippenger)
 
 
 class S256Test(TestCase):
@@ -10,6 +18,54 @@ class S256Test(TestCase):
         point = N * G
         self.assertIsNone(point.x)
 
+    def test_curve(self):
+        point = ecc.Point(S256Field(Gx), S256Field(Gy), S256Field(0), S256Field(7))
+        self.assertIs(point.curve, G.curve)
+        self.assertEqual(point, G)
+        self.assertEqual(ecc.Point.__rmul__(G, 1485), 1485 * G)
+
+    def test_add(self):
+        a = 7 * G
+        b = 1485 * G
+        self.assertEqual(a + b, 1492 * G)
+        self.assertEqual(a + a, 14 * G)
+        self.assertIsNone((a + (N - 7) * G).x)
+        self.assertEqual(a + S256Point(None, None), a)
+
+    def test_g_multiply(self):
+        for coefficient in (1, 15, 16, 2**255 + 1, N - 1, randint(1, N)):
+            self.assertEqual(
+                S256Point.from_jacobian(g_multiply(coefficient)),
+                S256Point.from_jacobian(jacobian_multiply(G.to_jacobian(), coefficient)))
+
+    def test_wnaf(self):
+        for coefficient in (1, 7, 2**128 - 1, randint(1, N)):
+            digits = wnaf(coefficient, 5)
+            self.assertEqual(sum(d << i for i, d in enumerate(digits)), coefficient)
+            for d in digits:
+                self.assertTrue(d == 0 or (d & 1 and -16 < d < 16))
+
+    def test_multi_multiply(self):
+        point = 1485 * G
+        u, v = randint(1, N), randint(1, N)
+        result = jacobian_multi_multiply([
+            (u, odd_multiples(G.to_jacobian(), 4), 4),
+            (v, odd_multiples(point.to_jacobian(), 5), 5),
+        ])
+        self.assertEqual(S256Point.from_jacobian(result), u * G + v * point)
+
+    def test_glv(self):
+        self.assertEqual(LAMBDA * G, S256Point(BETA * Gx % P, Gy))
+        self.assertEqual(S256Point.from_jacobian(endomorphism(G.to_jacobian())), LAMBDA * G)
+        for coefficient in (1, N - 1, 2**128, randint(1, N)):
+            k1, k2 = glv_split(coefficient)
+            self.assertEqual((k1 + k2 * LAMBDA) % N, coefficient)
+            self.assertLess(abs(k1).bit_length(), 130)
+            self.assertLess(abs(k2).bit_length(), 130)
+        point = 1485 * G
+        coefficient = randint(1, N)
+        self.assertEqual(coefficient * point, 1485 * coefficient * G)
+
     def test_pubpoint(self):
         # write a test that tests the public point for the following
         points = (
@@ -46,6 +102,39 @@ class S256Test(TestCase):
         r = 0xeff69ef2b1bd93a66ed5219add4fb51e11a840f404876325a1e8ffe0529a2c
         s = 0xc7207fee197d27c618aea621406f6bf5ef6fca38681d82b2f06fddbdce6feab6
         self.assertTrue(point.verify(z, Signature(r, s)))
+        self.assertFalse(point.verify(z + 1, Signature(r, s)))
+
+    def test_batch_inverse(self):
+        values = [randint(1, N - 1) for _ in range(5)]
+        for value, inv in zip(values, batch_inverse(values, N)):
+            self.assertEqual(value * inv % N, 1)
+
+    def test_pippenger(self):
+        points = [(randint(-N, N), (i * G).to_jacobian()) for i in range(1, 40)]
+        want = S256Point(None, None)
+        for coefficient, p1 in points:
+            want += coefficient * S256Point.from_jacobian(p1)
+        self.assertEqual(S256Point.from_jacobian(pippenger(points)), want)
+
+    def test_batch_normalize(self):
+        points = odd_multiples(G.to_jacobian(), 4) + [INFINITY]
+        normalized = batch_normalize(points)
+        self.assertEqual(normalized[-1], INFINITY)
+        for p1, p2 in zip(points[:-1], normalized[:-1]):
+            self.assertEqual(p2[2], 1)
+            self.assertEqual(S256Point.from_jacobian(p1), S256Point(p2[0], p2[1]))
+
+    def test_verify_batch(self):
+        items = []
+        for secret in (7, 1485, 2**128):
+            pk = PrivateKey(secret)
+            z = randint(0, 2**256)
+            items.append((pk.point, z, pk.sign(z)))
+        self.assertEqual(verify_batch(items), [True, True, True])
+        point, z, sig = items[1]
+        items[1] = (point, z + 1, sig)
+        items.append((point, z, Signature(sig.r, 0)))
+        self.assertEqual(verify_batch(items), [True, False, True, False])
 
     def test_sec(self):
         coefficient = 999**3
@@ -73,6 +162,27 @@ class S256Test(TestCase):
         self.assertEqual(point.serialize_sec(
             compressed=True), bytes.fromhex(compressed))
 
+    def test_parse_sec(self):
+        for coefficient in (999**3, 123, 42424242):
+            point = coefficient * G
+            for compressed in (True, False):
+                sec = point.serialize_sec(compressed)
+                self.assertEqual(S256Point.parse_sec(sec), point)
+        with self.assertRaises(ValueError):
+            S256Point.parse_sec(b'\x02' + (5).to_bytes(32, 'big'))
+        sec = (1485 * G).serialize_sec()
+        point = S256Point.parse_sec(sec)
+        self.assertIs(S256Point.parse_sec(sec), point)
+        self.assertEqual(2 * point, 2970 * G)
+        self.assertEqual(3 * point, 4455 * G)
+        self.assertEqual(point.wnaf_tables()[0][-1][2], 1)
+        with self.assertRaises(ValueError):
+            S256Point(Gx, Gy + 1)
+
+    def test_p2wpkh_address(self):
+        self.assertEqual(G.p2wpkh_address(), 'bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4')
+        self.assertEqual(G.p2wpkh_address(testnet=True), 'tb1qw508d6qejxtdg4y5r3zarvary0c5xw7kxpjzsx')
+
     def test_address(self):
         secret = 888**3
         mainnet_address = '148dY81A9BmdpMhvYEVznrM45kWN32vSCN'
@@ -115,6 +225,64 @@ class SignatureTest(TestCase):
             self.assertEqual(sig2.s, s)
 
 
+class TableFileTest(TestCase):
+    def test_save_load(self):
+        pk = PrivateKey(1485)
+        z = randint(0, 2**256)
+        sig = pk.sign(z)
+        with TemporaryDirectory() as dirname:
+            filename = os.path.join(dirname, 'tables.bin')
+            save_tables(filename, [pk.point])
+            points = load_tables(filename)
+            self.assertEqual(points, [pk.point])
+            self.assertIs(S256Point.parse_sec(pk.point.serialize_sec()), points[0])
+            self.assertTrue(points[0].verify(z, sig))
+            self.assertEqual(12345 * G, S256Point.from_jacobian(jacobian_multiply(G.to_jacobian(), 12345)))
+            with open(filename, 'r+b') as f:
+                f.seek(100)
+                f.write(b'\xff')
+            with self.assertRaises(ValueError):
+                load_tables(filename)
+
+    def test_broken_file(self):
+        pk = PrivateKey(5)
+        want = pk.sign(1)
+        saved = (s256Ecc.TABLE_FILE, s256Ecc.G_TABLE, s256Ecc.G_ODD_MULTIPLES, s256Ecc.G_ODD_MULTIPLES_ENDO)
+        try:
+            with TemporaryDirectory() as dirname:
+                filename = os.path.join(dirname, 'tables.bin')
+                with open(filename, 'wb') as f:
+                    f.write(b'garbage')
+                s256Ecc.TABLE_FILE = filename
+                s256Ecc.G_TABLE = s256Ecc.G_ODD_MULTIPLES = s256Ecc.G_ODD_MULTIPLES_ENDO = None
+                # the file is ignored and tables are built
+                for _ in range(2):
+                    sig = pk.sign(1)
+                    self.assertEqual((sig.r, sig.s), (want.r, want.s))
+                    self.assertTrue(pk.point.verify(1, sig))
+                self.assertIsNone(s256Ecc.TABLE_FILE)
+                # explicit load still raises
+                with self.assertRaises(ValueError):
+                    load_tables(filename)
+        finally:
+            s256Ecc.TABLE_FILE, s256Ecc.G_TABLE, s256Ecc.G_ODD_MULTIPLES, s256Ecc.G_ODD_MULTIPLES_ENDO = saved
+
+
+class DeriveKeysTest(TestCase):
+    def test_derive_keys(self):
+        for start, step, compressed, testnet in ((1, 1, True, False), (2**128, 7, False, True)):
+            keys = list(derive_keys(start, 5, step, compressed, testnet, chunk_size=2))
+            self.assertEqual(len(keys), 5)
+            for i, (secret, sec, h160, address) in enumerate(keys):
+                self.assertEqual(secret, start + i * step)
+                point = secret * G
+                self.assertEqual(sec, point.serialize_sec(compressed))
+                self.assertEqual(h160, point.hash160(compressed))
+                self.assertEqual(address, point.address(compressed, testnet))
+        with self.assertRaises(ValueError):
+            list(derive_keys(N - 1, 2))
+
+
 class PrivateKeyTest(TestCase):
 
     def test_sign(self):
@@ -123,6 +291,44 @@ class PrivateKeyTest(TestCase):
         sig = pk.sign(z)
         self.assertTrue(pk.point.verify(z, sig))
 
+    def test_deterministic_k(self):
+        # RFC6979 with the same secret and message hash as the test vectors of python-ecdsa
+        pk = PrivateKey(0x1)
+        z = int.from_bytes(sha256(b'Satoshi Nakamoto').digest(), 'big')
+        self.assertEqual(
+            pk.deterministic_k(z),
+            0x8f8a276c19f4149656b280621e358cce24f5f52542772691ee69063b74f15d15)
+
+    def test_sign_many(self):
+        pk = PrivateKey(randint(0, N))
+        zs = [randint(0, 2**256) for _ in range(4)]
+        sigs = pk.sign_many(zs)
+        for z, sig in zip(zs, sigs):
+            want = pk.sign(z)
+            self.assertEqual((sig.r, sig.s), (want.r, want.s))
+            self.assertTrue(pk.point.verify(z, sig))
+
+    def test_lazy_point(self):
+        pk = PrivateKey(1485)
+        self.assertIsNone(pk._point)
+        pk.sign(1)
+        self.assertIsNone(pk._point)
+        self.assertEqual(pk.point, 1485 * G)
+        self.assertIs(pk.point, pk.point)
+
+    def test_parse(self):
+        for secret in (2**256 - 2**199, 0x0dba685b4511dbd3d368e5c4358a1277de9486447af7b3604a69b8d9d8b7889d):
+            pk = PrivateKey(secret)
+            self.assertEqual(PrivateKey.parse_hex(pk.hex()).secret, secret)
+            for compressed in (True, False):
+                for testnet in (True, False):
+                    wif = pk.wif(compressed, testnet)
+                    parsed = PrivateKey.parse_wif(wif)
+                    self.assertEqual(parsed.secret, secret)
+                    self.assertIsNone(parsed._point)
+        with self.assertRaises(ValueError):
+            PrivateKey.parse_wif('L5oLkpV3aqBJ4BgssVAsax1iRa77G5CVYnv9adQ6Z87te7TyUdSD')
+
     def test_wif(self):
         pk = PrivateKey(2**256 - 2**199)
         expected = 'L5oLkpV3aqBJ4BgssVAsax1iRa77G5CVYnv9adQ6Z87te7TyUdSC'
@@ -0,0 +1,122 @@
+# BIP340 Schnorr signatures on secp256k1.
+# Public keys are x-only(32 bytes), and R of signature always has even y,
+# so many signatures can be verified together by one multi-scalar multiplication.
+
+import os
+from secrets import randbelow
+from typing import List, Tuple
+
+from src.ecdsa.s256Ecc import (
+    N, P, PrivateKey, S256Point, endomorphism, g_multiply, glv_split,
+    jacobian_add, jacobian_negate, lift_x, pippenger, to_affine)
+from src.helper.helper import tagged_hash
+
+
+class SchnorrSignature:
+    def __init__(self, r: int, s: int):
+        self.r = r  # x of R
+        self.s = s
+
+    def __repr__(self) -> str:
+        return 'SchnorrSignature({:x},{:x})'.format(self.r, self.s)
+
+    def serialize(self) -> bytes:
+        '''returns 64 bytes (r: 32 bytes, s: 32 bytes)'''
+        return self.r.to_bytes(32, 'big') + self.s.to_bytes(32, 'big')
+
+    @classmethod
+    def parse(cls, signature_bin: bytes) -> 'SchnorrSignature':
+        if len(signature_bin) != 64:
+            raise ValueError('Schnorr signature must be 64 bytes')
+        r = int.from_bytes(signature_bin[:32], 'big')
+        s = int.from_bytes(signature_bin[32:], 'big')
+        return cls(r, s)
+
+
+def challenge(r: int, xonly: bytes, msg: bytes) -> int:
+    '''e = hash(R.x | P.x | msg) mod N'''
+    e = tagged_hash('BIP0340/challenge', r.to_bytes(32, 'big') + xonly + msg)
+    return int.from_bytes(e, 'big') % N
+
+
+def sign(private_key: PrivateKey, msg: bytes, aux_rand: bytes = None) -> SchnorrSignature:
+    '''
+    returns BIP340 signature of msg
+    aux_rand: 32 bytes auxiliary random data, os.urandom(32) is used if it is None.
+    '''
+    d = private_key.secret % N
+    if d == 0:
+        raise ValueError('secret must be in 1 ~ N - 1')
+    point = private_key.point
+    # use the secret of the point which has even y
+    if point.y.num % 2:
+        d = N - d
+    if aux_rand is None:
+        aux_rand = os.urandom(32)
+    xonly = point.serialize_xonly()
+    t = d ^ int.from_bytes(tagged_hash('BIP0340/aux', aux_rand), 'big')
+    rand = tagged_hash('BIP0340/nonce', t.to_bytes(32, 'big') + xonly + msg)
+    k = int.from_bytes(rand, 'big') % N
+    if k == 0:
+        raise ValueError('nonce is zero, try other aux_rand')
+    r, ry = to_affine(g_multiply(k))
+    if ry % 2:
+        k = N - k
+    e = challenge(r, xonly, msg)
+    return SchnorrSignature(r, (k + e * d) % N)
+
+
+def verify(xonly: bytes, msg: bytes, sig: SchnorrSignature) -> bool:
+    '''returns whether sig is valid BIP340 signature of msg for x-only public key'''
+    try:
+        point = S256Point.parse_xonly(xonly)
+    except ValueError:
+        return False
+    if sig.r >= P or sig.s >= N:
+        return False
+    e = challenge(sig.r, xonly, msg)
+    # R = s * G - e * P
+    x, y = to_affine(point.g_point_multiply(sig.s, N - e))
+    if x is None:
+        return False
+    return y % 2 == 0 and x == sig.r
+
+
+def verify_batch(items: List[Tuple[bytes, bytes, SchnorrSignature]]) -> List[bool]:
+    '''
+    items: [(x-only public key, msg, signature), ...]
+    return [whether the signature is valid, ...] (same order with items)
+    With random 128 bits a_i (a_1 = 1), all signatures are checked at once by
+    (sum a_i * s_i) * G == sum a_i * R_i + sum (a_i * e_i) * P_i
+    a_i * e_i is split by GLV, so every coefficient of pippenger is about 128 bits.
+    If this check fails, each signature is verified one by one to find the failures.
+    '''
+    results = [False] * len(items)
+    targets = []
+    pairs = []
+    s_sum = 0
+    for idx, (xonly, msg, sig) in enumerate(items):
+        if sig.r >= P or sig.s >= N:
+            continue
+        try:
+            point = S256Point.parse_xonly(xonly)
+            ry = lift_x(sig.r, True)
+        except ValueError:
+            continue
+        a = 1 if not targets else randbelow(2**128 - 1) + 1
+        s_sum += a * sig.s
+        pairs.append((a, (sig.r, ry, 1)))
+        k1, k2 = glv_split(a * challenge(sig.r, xonly, msg) % N)
+        pairs.append((k1, point.to_jacobian()))
+        pairs.append((k2, endomorphism(point.to_jacobian())))
+        targets.append(idx)
+    if not targets:
+        return results
+    total = jacobian_add(pippenger(pairs), jacobian_negate(g_multiply(s_sum % N)))
+    if not total[2]:
+        for idx in targets:
+            results[idx] = True
+        return results
+    for idx in targets:
+        results[idx] = verify(*items[idx])
+    return results
@@ -0,0 +1,67 @@
+from random import randint
+from unittest import TestCase
+
+from src.ecdsa.s256Ecc import PrivateKey
+from src.ecdsa.schnorr import SchnorrSignature, sign, verify, verify_batch
+
+
+class SchnorrTest(TestCase):
+    # test vectors from BIP340 (secret, public key, aux_rand, message, signature)
+    vectors = (
+        ('0000000000000000000000000000000000000000000000000000000000000003',
+         'f9308a019258c31049344f85f89d5229b531c845836f99b08601f113bce036f9',
+         '0000000000000000000000000000000000000000000000000000000000000000',
+         '0000000000000000000000000000000000000000000000000000000000000000',
+         'e907831f80848d1069a5371b402410364bdf1c5f8307b0084c55f1ce2dca821525f66a4a85ea8b71e482a74f382d2ce5ebeee8fdb2172f477df4900d310536c0'),
+        ('b7e151628aed2a6abf7158809cf4f3c762e7160f38b4da56a784d9045190cfef',
+         'dff1d77f2a671c5f36183726db2341be58feae1da2deced843240f7b502ba659',
+         '0000000000000000000000000000000000000000000000000000000000000001',
+         '243f6a8885a308d313198a2e03707344a4093822299f31d0082efa98ec4e6c89',
+         '6896bd60eeae296db48a229ff71dfe071bde413e6d43f917dc8dcf8c78de33418906d11ac976abccb20b091292bff4ea897efcb639ea871cfa95f6de339e4b0a'),
+        ('c90fdaa22168c234c4c6628b80dc1cd129024e088a67cc74020bbea63b14e5c9',
+         'dd308afec5777e13121fa72b9cc1b7cc0139715309b086c960e18fd969774eb8',
+         'c87aa53824b4d7ae2eb035a2b5bbbccc080e76cdc6d1692c4b0b62d798e6d906',
+         '7e2d58d8b3bcdf1abadec7829054f90dda9805aab56c77333024b9d0a508b75c',
+         '5831aaeed7b44bb74e5eab94ba9d4294c49bcf2a60728d8b4c200f50dd313c1bab745879a5ad954a72c45a91c3a51d3c7adea98d82f8481e0e1e03674a6f3fb7'),
+    )
+
+    def test_sign(self):
+        for secret, xonly, aux_rand, msg, want in self.vectors:
+            pk = PrivateKey(int(secret, 16))
+            self.assertEqual(pk.point.serialize_xonly().hex(), xonly)
+            sig = sign(pk, bytes.fromhex(msg), bytes.fromhex(aux_rand))
+            self.assertEqual(sig.serialize().hex(), want)
+
+    def test_verify(self):
+        for _, xonly, _, msg, sig in self.vectors:
+            self.assertTrue(verify(bytes.fromhex(xonly), bytes.fromhex(msg),
+                                   SchnorrSignature.parse(bytes.fromhex(sig))))
+        # verify only vector
+        xonly = bytes.fromhex('d69c3509bb99e412e68b0fe8544e72837dfa30746d8be2aa65975f29d22dc7b9')
+        msg = bytes.fromhex('4df3c3f68fcc83b27e9d42c90431a72499f17875c81a599b566c9889b9696703')
+        sig = SchnorrSignature.parse(bytes.fromhex(
+            '00000000000000000000003b78ce563f89a0ed9414f5aa28ad0d96d6795f9c6376afb1548af603b3eb45c9f8207dee1060cb71c04e80f593060b07d28308d7f4'))
+        self.assertTrue(verify(xonly, msg, sig))
+        # public key is not on the curve
+        xonly = bytes.fromhex('eefdea4cdb677750a420fee807eacf21eb9898ae79b9768766e4faa04a2d4a34')
+        self.assertFalse(verify(xonly, msg, sig))
+        # R has odd y
+        xonly = bytes.fromhex('dff1d77f2a671c5f36183726db2341be58feae1da2deced843240f7b502ba659')
+        msg = bytes.fromhex('243f6a8885a308d313198a2e03707344a4093822299f31d0082efa98ec4e6c89')
+        sig = SchnorrSignature.parse(bytes.fromhex(
+            'fff97bd5755eeea420453a14355235d382f6472f8568a18b2f057a14602975563cc27944640ac607cd107ae10923d9ef7a73c643e166be5ebeafa34b1ac553e2'))
+        self.assertFalse(verify(xonly, msg, sig))
+
+    def test_verify_batch(self):
+        items = []
+        for _ in range(6):
+            pk = PrivateKey(randint(1, 2**256))
+            msg = randint(0, 2**256).to_bytes(33, 'big')
+            items.append((pk.point.serialize_xonly(), msg, sign(pk, msg)))
+        self.assertEqual(verify_batch(items), [True] * 6)
+        xonly, msg, sig = items[2]
+        items[2] = (xonly, msg + b'\x00', sig)
+        xonly, msg, sig = items[4]
+        items[4] = (xonly, msg, SchnorrSignature(sig.r, sig.s + 1))
+        self.assertEqual(verify_batch(items), [True, True, False, True, False, True])
+        self.assertEqual(verify_batch([]), [])
@@ -1,11 +1,15 @@
+from collections import OrderedDict
 import hashlib
-from typing import List, Union
+import struct
+import weakref
+from typing import Any, Iterable, List, Tuple, Union
 from unittest import TestSuite, TextTestRunner
 from io import BytesIO
 
 SIGHASH_ALL = 1
 SIGHASH_NONE = 2
 SIGHASH_SINGLE = 3
+SIGHASH_ANYONECANPAY = 0x80
 BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
 TWO_WEEKS = 60 * 60 * 24 * 14
 MAX_TARGET = 0xffff * 256**(0x1d - 3)
@@ -17,6 +21,216 @@ def run(test):
     TextTestRunner().run(suite)
 
 
+class LRUCache:
+    '''
+    Dict which keeps at most max_size items.
+    When it is full, the least recently used item is evicted first.
+    '''
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self) -> str:
+        return 'LRUCache({}/{}, hits: {}, misses: {})'.format(
+            len(self.data), self.max_size, self.hits, self.misses)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.data
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        '''return cached value(and mark it as recently used) or default'''
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Any, value: Any) -> None:
+        self.data[key] = value
+        self.data.move_to_end(key)
+        self.evict()
+
+    def evict(self) -> None:
+        '''drop least recently used items until it fits in max_size'''
+        while len(self.data) > max(self.max_size, 0):
+            self.data.popitem(last=False)
+
+    def resize(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.evict()
+
+    def clear(self) -> None:
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class Tracked:
+    '''
+    Base of objects which cache their serialization(or hash).
+    Setting one of tracked_fields(or calling changed) clears the cache of itself
+    and of every object which contains it(owners, weak references).
+    '''
+    tracked_fields = frozenset()
+    # whether clear_cache is overridden
+    has_cache = False
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        # object.__setattr__ keeps property setters working
+        object.__setattr__(self, name, value)
+        if name in self.tracked_fields:
+            if isinstance(value, Tracked):
+                value.track(self)
+            # nothing to clear for new object without owners
+            if 'owners' in self.__dict__ or self.has_cache:
+                self.changed()
+
+    def __getstate__(self) -> dict:
+        # owners are weak references, they are not sent with this object
+        state = self.__dict__.copy()
+        state.pop('owners', None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        d = self.__dict__
+        d.update(state)
+        # owners are not pickled, so contained objects are tracked again
+        for name, value in state.items():
+            if type(value) is TrackedList:
+                value.owner = weakref.ref(self)
+                value.track(value)
+            elif name in self.tracked_fields and isinstance(value, Tracked):
+                value.track(self)
+
+    def track(self, owner: 'Tracked') -> None:
+        '''owner.changed() is called whenever this object is changed'''
+        d = self.__dict__
+        owners = d.get('owners')
+        # one owner(weakref.ref) is the common case, WeakSet only for shared objects
+        if owners is None:
+            d['owners'] = weakref.ref(owner)
+        elif type(owners) is weakref.ref:
+            current = owners()
+            if current is None:
+                d['owners'] = weakref.ref(owner)
+            elif current is not owner:
+                d['owners'] = weakref.WeakSet((current, owner))
+        else:
+            owners.add(owner)
+
+    def changed(self) -> None:
+        self.clear_cache()
+        owners = self.__dict__.get('owners')
+        if owners is None:
+            return
+        if type(owners) is weakref.ref:
+            owner = owners()
+            if owner is not None:
+                owner.changed()
+        else:
+            for owner in list(owners):
+                owner.changed()
+
+    def clear_cache(self) -> None:
+        pass
+
+
+class TrackedList(list):
+    '''list which calls owner.changed() when it is modified'''
+    # unpickling extends the list before __setstate__
+    owner = None
+
+    def __init__(self, items: Iterable = (), owner: Tracked = None, tracked: bool = False):
+        '''tracked: items already have owner'''
+        super().__init__(items)
+        self.owner = None if owner is None else weakref.ref(owner)
+        if not tracked:
+            self.track(self)
+
+    def __reduce_ex__(self, protocol: int) -> tuple:
+        # rebuilt without owner, the owning Tracked sets it again in __setstate__
+        return self.__class__, (list(self),)
+
+    def track(self, items: Iterable) -> None:
+        owner = self.owner and self.owner()
+        if owner is None:
+            return
+        for item in items:
+            if isinstance(item, Tracked):
+                item.track(owner)
+
+    def modified(self, items: Iterable = ()) -> None:
+        self.track(items)
+        owner = self.owner and self.owner()
+        if owner is not None:
+            owner.changed()
+
+    def append(self, item: Any) -> None:
+        super().append(item)
+        self.modified((item,))
+
+    def extend(self, items: Iterable) -> None:
+        items = list(items)
+        super().extend(items)
+        self.modified(items)
+
+    def __iadd__(self, items: Iterable) -> 'TrackedList':
+        self.extend(items)
+        return self
+
+    def __imul__(self, n: int) -> 'TrackedList':
+        super().__imul__(n)
+        self.modified()
+        return self
+
+    def insert(self, index: int, item: Any) -> None:
+        super().insert(index, item)
+        self.modified((item,))
+
+    def __setitem__(self, index: Union[int, slice], item: Any) -> None:
+        if isinstance(index, slice):
+            item = list(item)
+            super().__setitem__(index, item)
+            self.modified(item)
+        else:
+            super().__setitem__(index, item)
+            self.modified((item,))
+
+    def __delitem__(self, index: Union[int, slice]) -> None:
+        super().__delitem__(index)
+        self.modified()
+
+    def pop(self, index: int = -1) -> Any:
+        item = super().pop(index)
+        self.modified()
+        return item
+
+    def remove(self, item: Any) -> None:
+        super().remove(item)
+        self.modified()
+
+    def clear(self) -> None:
+        super().clear()
+        self.modified()
+
+    def sort(self, *args, **kwargs) -> None:
+        super().sort(*args, **kwargs)
+        self.modified()
+
+    def reverse(self) -> None:
+        super().reverse()
+        self.modified()
+
+
 def hash160(s: bytes) -> bytes:
     '''sha256 followed by ripemd160(20bytes)'''
     return hashlib.new('ripemd160', hashlib.sha256(s).digest()).digest()
@@ -27,23 +241,45 @@ def hash256(s: bytes) -> bytes:
     return hashlib.sha256(hashlib.sha256(s).digest()).digest()
 
 
+# sha256 state after sha256(tag) + sha256(tag) for each tag
+TAGGED_HASH_PREFIX = {}
+
+
+def tagged_hash(tag: str, msg: bytes) -> bytes:
+    '''sha256(sha256(tag) + sha256(tag) + msg), BIP340 tagged hash(32bytes)'''
+    prefix = TAGGED_HASH_PREFIX.get(tag)
+    if prefix is None:
+        tag_hash = hashlib.sha256(tag.encode('utf-8')).digest()
+        prefix = hashlib.sha256(tag_hash + tag_hash)
+        TAGGED_HASH_PREFIX[tag] = prefix
+    h = prefix.copy()
+    h.update(msg)
+    return h.digest()
+
+
+# digit value of each base58 character(invalid: -1)
+BASE58_INDEX = [BASE58_ALPHABET.find(chr(code)) for code in range(128)]
+# base58 digits are handled BASE58_CHUNK digits per big int operation
+BASE58_CHUNK = 10
+BASE58_CHUNK_BASE = 58 ** BASE58_CHUNK
+# every 2 digits string for 0 ~ 58 ** 2 - 1
+BASE58_PAIRS = [a + b for a in BASE58_ALPHABET for b in BASE58_ALPHABET]
+
+
 def encode_base58(s: bytes) -> str:
     '''return base58 encoded string data'''
-    # <-- this loop and prefix are used for making fixed length.
-    count = 0
-    for c in s:
-        if c == 0:
-            count += 1
-        else:
-            break
-    prefix = '1' * count
-    # -->
+    # leading zero bytes are kept as '1'
+    count = len(s) - len(s.lstrip(b'\x00'))
     num = int.from_bytes(s, 'big')
-    result = ''
+    pairs = BASE58_PAIRS
+    chunks = []
     while num > 0:
-        num, mod = divmod(num, 58)
-        result = BASE58_ALPHABET[mod] + result
-    return prefix + result
+        num, chunk = divmod(num, BASE58_CHUNK_BASE)
+        for _ in range(BASE58_CHUNK // 2):
+            chunk, mod = divmod(chunk, 3364)
+            chunks.append(pairs[mod])
+    result = ''.join(reversed(chunks)).lstrip('1')
+    return '1' * count + result
 
 
 def encode_base58_checksum(b: bytes) -> str:
@@ -52,21 +288,52 @@ def encode_base58_checksum(b: bytes) -> str:
     return encode_base58(b + checksum)
 
 
-def decode_base58(s: bytes) -> bytes:
+def decode_base58_raw(s: str) -> bytes:
+    '''return data of base58 string(any length, checksum is not checked)'''
+    count = len(s) - len(s.lstrip('1'))
+    index = BASE58_INDEX
     num = 0
-    for c in s:
-        num *= 58
-        num += BASE58_ALPHABET.index(c)
-    # because, address is 25bytes
-    # prefix(testnet or not,  1bytes) + hash160(20bytes) + checksum(4bytes)
-    # now, this function looks like decode_address.
-    # TODO: now, decode base 58 is fixed 25 bytes.
-    combined = num.to_bytes(25, 'big')
-    checksum = combined[-4:]
-    if hash256(combined[:-4])[:4] != checksum:
-        raise ValueError('bad address:{} {}'.format(
-            checksum, hash256(combined[:-4])[:4]))
-    return combined[1:-4]
+    # first chunk takes the remainder, so the others are full BASE58_CHUNK digits
+    start = 0
+    end = len(s) % BASE58_CHUNK or BASE58_CHUNK
+    while start < len(s):
+        chunk = 0
+        for c in s[start:end]:
+            value = index[ord(c)] if ord(c) < 128 else -1
+            if value < 0:
+                raise ValueError('invalid base58 character: {!r}'.format(c))
+            chunk = chunk * 58 + value
+        num = num * BASE58_CHUNK_BASE + chunk
+        start, end = end, end + BASE58_CHUNK
+    return b'\x00' * count + num.to_bytes((num.bit_length() + 7) // 8, 'big')
+
+
+def decode_base58_checksum(s: str) -> bytes:
+    '''return data of base58 with checksum(any length, ex. wif), checksum is removed'''
+    combined = decode_base58_raw(s)
+    data, checksum = combined[:-4], combined[-4:]
+    if len(combined) < 4 or hash256(data)[:4] != checksum:
+        raise ValueError('bad checksum: {}'.format(s))
+    return data
+
+
+def decode_base58(s: str) -> bytes:
+    '''return data of base58 address, version byte and checksum are removed'''
+    return decode_base58_checksum(s)[1:]
+
+
+def encode_base58_many(items: Iterable[bytes], checksum: bool = True) -> List[str]:
+    '''encode_base58_checksum(or encode_base58) for each item'''
+    if checksum:
+        return [encode_base58_checksum(b) for b in items]
+    return [encode_base58(b) for b in items]
+
+
+def decode_base58_many(items: Iterable[str], checksum: bool = True) -> List[bytes]:
+    '''decode_base58_checksum(or decode_base58_raw) for each item'''
+    if checksum:
+        return [decode_base58_checksum(s) for s in items]
+    return [decode_base58_raw(s) for s in items]
 
 
 def little_endian_to_int(b: bytes) -> int:
@@ -81,6 +348,8 @@ def int_to_little_endian(n: int, length: int) -> bytes:
 
 def read_varint(s: BytesIO) -> int:
     '''return integer from bytes stream'''
+    if isinstance(s, Reader):
+        return s.read_varint()
     i = s.read(1)[0]
     if i < 0xfd:
         return i
@@ -106,6 +375,303 @@ def encode_varint(i: int) -> bytes:
     raise ValueError('Too big to send {}'.format(i))
 
 
+UINT8 = struct.Struct('<B')
+UINT16 = struct.Struct('<H')
+UINT32 = struct.Struct('<I')
+UINT64 = struct.Struct('<Q')
+
+
+class Reader:
+    '''
+    Reads fields of bitcoin serialization from one bytes object.
+    Fields are unpacked in place(struct.unpack_from), read_view returns memoryview(no copy).
+    It has read(n) like BytesIO, so it can be used where stream is expected.
+    bytearray or memoryview is not copied(BufferReader), it must not be changed
+    while parsed objects use it.
+    '''
+    __slots__ = ('data', 'pos', 'size')
+
+    # data is the caller's buffer, parsed objects can refer to it without copy
+    private_data = False
+
+    def __new__(cls, data: Union[bytes, bytearray, memoryview], *args) -> 'Reader':
+        if cls is Reader and type(data) is not bytes:
+            cls = BufferReader
+        return object.__new__(cls)
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview], pos: int = 0):
+        self.data = data
+        self.pos = pos
+        self.size = len(data)
+
+    def __repr__(self) -> str:
+        return 'Reader({}/{})'.format(self.pos, self.size)
+
+    def __enter__(self) -> 'Reader':
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    @classmethod
+    def of(cls, s: Any) -> 'Reader':
+        '''
+        Returns Reader of bytes(or other buffer), Reader(itself) or seekable stream
+        With stream, position of stream is updated when `with` block is over.
+        Not seekable stream(ex. socket) can not be read back, so it is not accepted.
+        '''
+        if isinstance(s, Reader):
+            return s
+        if isinstance(s, (bytes, bytearray, memoryview)):
+            return cls(s)
+        if isinstance(s, BytesIO):
+            return StreamReader(s, s.getvalue(), s.tell())
+        if hasattr(s, 'seekable') and s.seekable():
+            return ChunkedReader(s)
+        raise TypeError('can not read from {}, read the bytes first'.format(type(s).__name__))
+
+    def eof(self, n: int) -> SyntaxError:
+        return SyntaxError('unexpected end of data, need {} bytes at {}'.format(n, self.pos))
+
+    def remaining(self) -> int:
+        return self.size - self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, pos: int) -> None:
+        self.pos = pos
+
+    def skip(self, n: int) -> None:
+        if self.pos + n > self.size:
+            raise self.eof(n)
+        self.pos += n
+
+    def read_view(self, n: int) -> memoryview:
+        '''return next n bytes as memoryview(no copy)'''
+        pos = self.pos
+        end = pos + n
+        if end > self.size:
+            raise self.eof(n)
+        self.pos = end
+        return memoryview(self.data)[pos:end]
+
+    def read(self, n: int) -> bytes:
+        pos = self.pos
+        end = pos + n
+        if end > self.size:
+            raise self.eof(n)
+        self.pos = end
+        return self.data[pos:end]
+
+    def read_hash(self) -> bytes:
+        '''return next 32 bytes in reversed order(little endian hash)'''
+        pos = self.pos
+        end = pos + 32
+        if end > self.size:
+            raise self.eof(32)
+        self.pos = end
+        return self.data[pos:end][::-1]
+
+    def read_struct(self, fmt: struct.Struct) -> tuple:
+        '''return fields of precompiled struct at once'''
+        pos = self.pos
+        end = pos + fmt.size
+        if end > self.size:
+            raise self.eof(fmt.size)
+        self.pos = end
+        return fmt.unpack_from(self.data, pos)
+
+    def read_var_bytes(self) -> bytes:
+        '''return bytes which is prefixed with varint length'''
+        return self.read(self.read_varint())
+
+    def read_uint8(self) -> int:
+        pos = self.pos
+        if pos >= self.size:
+            raise self.eof(1)
+        self.pos = pos + 1
+        return self.data[pos]
+
+    def read_uint16(self) -> int:
+        pos = self.pos
+        if pos + 2 > self.size:
+            raise self.eof(2)
+        self.pos = pos + 2
+        return UINT16.unpack_from(self.data, pos)[0]
+
+    def read_uint32(self) -> int:
+        pos = self.pos
+        if pos + 4 > self.size:
+            raise self.eof(4)
+        self.pos = pos + 4
+        return UINT32.unpack_from(self.data, pos)[0]
+
+    def read_uint64(self) -> int:
+        pos = self.pos
+        if pos + 8 > self.size:
+            raise self.eof(8)
+        self.pos = pos + 8
+        return UINT64.unpack_from(self.data, pos)[0]
+
+    def read_varint(self) -> int:
+        pos = self.pos
+        if pos >= self.size:
+            raise self.eof(1)
+        i = self.data[pos]
+        self.pos = pos + 1
+        if i < 0xfd:
+            return i
+        if i == 0xfd:
+            return self.read_uint16()
+        if i == 0xfe:
+            return self.read_uint32()
+        return self.read_uint64()
+
+
+class BufferReader(Reader):
+    '''Reader of bytearray or memoryview, only bytes which are returned are copied'''
+    __slots__ = ()
+
+    def read(self, n: int) -> bytes:
+        return bytes(super().read(n))
+
+    def read_hash(self) -> bytes:
+        return bytes(super().read_view(32)[::-1])
+
+
+class StreamReader(Reader):
+    '''
+    Reader of seekable stream contents(from offset),
+    it moves the stream to where it stopped
+    '''
+    __slots__ = ('stream', 'offset')
+
+    # data is read from the stream for this reader only
+    private_data = True
+
+    def __init__(self, stream: Any, data: bytes, pos: int = 0, offset: int = 0):
+        self.data = data
+        self.pos = pos
+        self.size = len(data)
+        self.stream = stream
+        self.offset = offset
+
+    def __exit__(self, *args) -> None:
+        self.stream.seek(self.offset + self.pos)
+
+
+class ChunkedReader(StreamReader):
+    '''
+    Reader of seekable stream which is not in memory(ex. file).
+    The stream is read on demand in growing chunks, so a little more than
+    the parsed record is read and the rest is left for the next parse.
+    '''
+    __slots__ = ()
+
+    CHUNK_SIZE = 4096
+
+    def __init__(self, stream: Any):
+        super().__init__(stream, b'', 0, stream.tell())
+
+    def fill(self, n: int) -> None:
+        '''reads the stream until next n bytes are in data(or the stream is over)'''
+        need = self.pos + n - self.size
+        while need > 0:
+            # at least doubles data, so records of any size are read in linear time
+            chunk = self.stream.read(max(need, self.size, self.CHUNK_SIZE))
+            if not chunk:
+                break
+            self.data += chunk
+            self.size += len(chunk)
+            need -= len(chunk)
+
+    def skip(self, n: int) -> None:
+        self.fill(n)
+        super().skip(n)
+
+    def read_view(self, n: int) -> memoryview:
+        self.fill(n)
+        return super().read_view(n)
+
+    def read(self, n: int) -> bytes:
+        self.fill(n)
+        return super().read(n)
+
+    def read_hash(self) -> bytes:
+        self.fill(32)
+        return super().read_hash()
+
+    def read_struct(self, fmt: struct.Struct) -> tuple:
+        self.fill(fmt.size)
+        return super().read_struct(fmt)
+
+    def read_uint8(self) -> int:
+        self.fill(1)
+        return super().read_uint8()
+
+    def read_uint16(self) -> int:
+        self.fill(2)
+        return super().read_uint16()
+
+    def read_uint32(self) -> int:
+        self.fill(4)
+        return super().read_uint32()
+
+    def read_uint64(self) -> int:
+        self.fill(8)
+        return super().read_uint64()
+
+    def read_varint(self) -> int:
+        # prefix and the longest value
+        self.fill(9)
+        return super().read_varint()
+
+
+class Writer:
+    '''Builds bitcoin serialization by appending fields into one bytearray'''
+    __slots__ = ('buf',)
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.buf)
+
+    def getvalue(self) -> bytes:
+        return bytes(self.buf)
+
+    def write(self, b: Union[bytes, bytearray, memoryview]) -> None:
+        self.buf += b
+
+    def write_hash(self, h: bytes) -> None:
+        '''write 32 bytes hash in reversed order(little endian)'''
+        self.buf += h[::-1]
+
+    def write_var_bytes(self, b: bytes) -> None:
+        '''write bytes with varint length prefix'''
+        self.write_varint(len(b))
+        self.buf += b
+
+    def write_uint8(self, n: int) -> None:
+        self.buf.append(n)
+
+    def write_uint16(self, n: int) -> None:
+        self.buf += UINT16.pack(n)
+
+    def write_uint32(self, n: int) -> None:
+        self.buf += UINT32.pack(n)
+
+    def write_uint64(self, n: int) -> None:
+        self.buf += UINT64.pack(n)
+
+    def write_varint(self, i: int) -> None:
+        if i < 0xfd:
+            self.buf.append(i)
+        else:
+            self.buf += encode_varint(i)
+
+
 def h160_to_p2pkh_address(h160: bytes, testnet=False) -> str:
     '''
     Takes a byte sequence hash160 and returns a p2pkh address string
@@ -132,6 +698,151 @@ def h160_to_p2sh_address(h160: bytes, testnet=False) -> str:
     return encode_base58_checksum(prefix + h160)
 
 
+BECH32_ALPHABET = 'qpzry9x8gf2tvdw0s3jn54khce6mua7l'
+# 5bit value of each bech32 character(invalid: -1)
+BECH32_INDEX = [BECH32_ALPHABET.find(chr(code)) for code in range(128)]
+# checksum constants of bech32(BIP173, segwit v0) and bech32m(BIP350, segwit v1+)
+BECH32 = 1
+BECH32M = 0x2bc830a3
+BECH32_GENERATOR = (0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3)
+
+
+def _build_bech32_table() -> List[int]:
+    '''xor of generators selected by the top 5 bits of the checksum'''
+    table = []
+    for top in range(32):
+        value = 0
+        for bit, gen in enumerate(BECH32_GENERATOR):
+            if (top >> bit) & 1:
+                value ^= gen
+        table.append(value)
+    return table
+
+
+BECH32_TABLE = _build_bech32_table()
+BECH32_MAX_LENGTH = 90
+# polymod state after the expanded hrp, for each hrp
+BECH32_HRP_STATE = {}
+SEGWIT_HRP = {False: 'bc', True: 'tb'}
+
+
+def bech32_polymod(values: Iterable[int], chk: int = 1) -> int:
+    '''BCH checksum of 5bit values, starting from chk'''
+    table = BECH32_TABLE
+    for v in values:
+        chk = ((chk & 0x1ffffff) << 5) ^ v ^ table[chk >> 25]
+    return chk
+
+
+def bech32_hrp_state(hrp: str) -> int:
+    '''polymod of the expanded hrp(high bits, 0, low bits)'''
+    state = BECH32_HRP_STATE.get(hrp)
+    if state is None:
+        expanded = [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+        state = bech32_polymod(expanded)
+        BECH32_HRP_STATE[hrp] = state
+    return state
+
+
+def bytes_to_5bits(data: bytes) -> List[int]:
+    '''regroup 8bit bytes into 5bit values, last value is padded with zero bits'''
+    count = (len(data) * 8 + 4) // 5
+    num = int.from_bytes(data, 'big') << (count * 5 - len(data) * 8)
+    return [(num >> shift) & 31 for shift in range(count * 5 - 5, -1, -5)]
+
+
+def bits5_to_bytes(values: List[int]) -> bytes:
+    '''regroup 5bit values into bytes, padding must be less than 5 zero bits'''
+    num = 0
+    for v in values:
+        num = (num << 5) | v
+    pad = len(values) * 5 % 8
+    if pad > 4 or num & ((1 << pad) - 1):
+        raise ValueError('invalid padding')
+    return (num >> pad).to_bytes(len(values) * 5 // 8, 'big')
+
+
+def encode_bech32(hrp: str, values: List[int], spec: int = BECH32) -> str:
+    '''return hrp + '1' + data + checksum(6 chars)'''
+    polymod = bech32_polymod(values, bech32_hrp_state(hrp))
+    polymod = bech32_polymod((0, 0, 0, 0, 0, 0), polymod) ^ spec
+    checksum = [(polymod >> shift) & 31 for shift in (25, 20, 15, 10, 5, 0)]
+    return hrp + '1' + ''.join([BECH32_ALPHABET[v] for v in values + checksum])
+
+
+def decode_bech32(s: str) -> Tuple[str, List[int], int]:
+    '''return (hrp, 5bit values without checksum, spec(BECH32 or BECH32M))'''
+    if len(s) > BECH32_MAX_LENGTH:
+        raise ValueError('too long bech32 string: {}'.format(len(s)))
+    lower = s.lower()
+    if lower != s and s.upper() != s:
+        raise ValueError('mixed case bech32 string: {}'.format(s))
+    pos = lower.rfind('1')
+    if pos < 1 or pos + 7 > len(lower):
+        raise ValueError('bad separator position: {}'.format(s))
+    hrp = lower[:pos]
+    if any(ord(c) < 33 or ord(c) > 126 for c in hrp):
+        raise ValueError('invalid hrp: {}'.format(hrp))
+    index = BECH32_INDEX
+    values = []
+    for c in lower[pos + 1:]:
+        value = index[ord(c)] if ord(c) < 128 else -1
+        if value < 0:
+            raise ValueError('invalid bech32 character: {!r}'.format(c))
+        values.append(value)
+    spec = bech32_polymod(values, bech32_hrp_state(hrp))
+    if spec != BECH32 and spec != BECH32M:
+        raise ValueError('bad checksum: {}'.format(s))
+    return hrp, values[:-6], spec
+
+
+def encode_segwit_address(version: int, program: bytes, testnet=False) -> str:
+    '''
+    Takes a witness version and program and returns a segwit address string
+    v0 uses bech32 checksum, v1(taproot) and later use bech32m checksum
+    '''
+    if version < 0 or version > 16:
+        raise ValueError('invalid witness version: {}'.format(version))
+    if len(program) < 2 or len(program) > 40 or (version == 0 and len(program) not in (20, 32)):
+        raise ValueError('invalid witness program length: {}'.format(len(program)))
+    spec = BECH32 if version == 0 else BECH32M
+    return encode_bech32(SEGWIT_HRP[testnet], [version] + bytes_to_5bits(program), spec)
+
+
+def decode_segwit_address(address: str, testnet=False) -> Tuple[int, bytes]:
+    '''return (witness version, witness program) of segwit address'''
+    hrp, values, spec = decode_bech32(address)
+    if hrp != SEGWIT_HRP[testnet]:
+        raise ValueError('bad hrp: {}'.format(hrp))
+    if not values or values[0] > 16:
+        raise ValueError('invalid witness version: {}'.format(address))
+    version = values[0]
+    if spec != (BECH32 if version == 0 else BECH32M):
+        raise ValueError('bad checksum type for version {}: {}'.format(version, address))
+    program = bits5_to_bytes(values[1:])
+    if len(program) < 2 or len(program) > 40 or (version == 0 and len(program) not in (20, 32)):
+        raise ValueError('invalid witness program length: {}'.format(len(program)))
+    return version, program
+
+
+def encode_segwit_addresses(programs: Iterable[Tuple[int, bytes]], testnet=False) -> List[str]:
+    '''encode_segwit_address for each (version, program)'''
+    return [encode_segwit_address(version, program, testnet) for version, program in programs]
+
+
+def decode_segwit_addresses(addresses: Iterable[str], testnet=False) -> List[Tuple[int, bytes]]:
+    '''decode_segwit_address for each address'''
+    return [decode_segwit_address(address, testnet) for address in addresses]
+
+
+def h160_to_p2wpkh_address(h160: bytes, testnet=False) -> str:
+    '''
+    Takes a byte sequence hash160 and returns a p2wpkh address string
+    p2wpkh is witness version 0 with 20 bytes program
+    '''
+    return encode_segwit_address(0, h160, testnet)
+
+
 def bits_to_target(bits: bytes) -> int:
     '''Turns bits into a target(large 256-bit integer)'''
     exp = bits[-1]
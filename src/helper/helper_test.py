@@ -1,9 +1,23 @@
 from unittest import TestCase
 from io import BytesIO
+from tempfile import TemporaryFile
 
 from src.helper.helper import (
+    LRUCache,
+    Reader,
+    Writer,
     bit_field_to_bytes,
     bytes_to_bit_field,
+    decode_base58,
+    decode_base58_checksum,
+    decode_base58_many,
+    decode_base58_raw,
+    decode_segwit_address,
+    decode_segwit_addresses,
+    encode_base58,
+    encode_base58_many,
+    encode_segwit_address,
+    encode_segwit_addresses,
     encode_varint,
     h160_to_p2pkh_address,
     h160_to_p2sh_address,
@@ -18,6 +32,77 @@ from src.helper.helper import (
 
 
 class HelperTest(TestCase):
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.resize(1)
+        self.assertEqual(len(cache), 1)
+        self.assertIn('c', cache)
+
+    def test_reader(self):
+        raw = bytes.fromhex('01000000fd0302' + 'ab' * 32 + '03616263ff')
+        stream = BytesIO(raw)
+        with Reader.of(stream) as reader:
+            self.assertEqual(reader.read_uint32(), 1)
+            self.assertEqual(reader.read_varint(), 0x203)
+            self.assertEqual(reader.read_hash(), b'\xab' * 32)
+            self.assertEqual(reader.read_var_bytes(), b'abc')
+        # stream is moved to where reader stopped
+        self.assertEqual(stream.read(), b'\xff')
+        reader = Reader(raw)
+        reader.seek(len(raw) - 1)
+        self.assertEqual(reader.read_uint8(), 0xff)
+        with self.assertRaises(SyntaxError):
+            reader.read_uint32()
+        with self.assertRaises(SyntaxError):
+            reader.read(1)
+        # buffers are not copied, but returned fields are bytes
+        view = memoryview(bytearray(raw))
+        reader = Reader.of(view)
+        self.assertIs(reader.data, view)
+        self.assertEqual(reader.read(4), b'\x01\x00\x00\x00')
+        reader.skip(3)
+        self.assertEqual(reader.read_hash(), b'\xab' * 32)
+        self.assertEqual(reader.read_var_bytes(), b'abc')
+        # seekable stream is moved to where reader stopped
+        with TemporaryFile() as f:
+            f.write(b'\x00' + raw)
+            f.seek(1)
+            with Reader.of(f) as reader:
+                self.assertEqual(reader.read_uint32(), 1)
+            self.assertEqual(f.tell(), 5)
+            # large stream is read on demand, not to the end
+            f.write(bytes(100000) + b'\xfd\x00\x20' + bytes(0x2000))
+            f.seek(1)
+            with Reader.of(f) as reader:
+                reader.skip(100004)
+                self.assertEqual(len(reader.read_var_bytes()), 0x2000)
+            self.assertEqual(f.tell(), 100004 + 3 + 0x2000 + 1)
+            f.seek(1)
+            with Reader.of(f) as reader:
+                self.assertEqual(reader.read_uint32(), 1)
+                self.assertLessEqual(reader.size, reader.CHUNK_SIZE)
+                with self.assertRaises(SyntaxError):
+                    reader.skip(200000)
+        with self.assertRaises(TypeError):
+            Reader.of(object())
+
+    def test_writer(self):
+        writer = Writer()
+        writer.write_uint32(1)
+        writer.write_varint(0x203)
+        writer.write_hash(bytes(range(32)))
+        writer.write_var_bytes(b'abc')
+        writer.write_uint64(2)
+        want = '01000000fd0302' + bytes(range(32))[::-1].hex() + '036162630200000000000000'
+        self.assertEqual(writer.getvalue().hex(), want)
+
     def test_little_endian_to_int(self):
         h = bytes.fromhex('99c3980000000000')
         want = 10011545
@@ -57,6 +142,63 @@ class HelperTest(TestCase):
         want = '2N3u1R6uwQfuobCqbCgBkpsgBxvr1tZpe7B'
         self.assertEqual(h160_to_p2sh_address(h160, testnet=True), want)
 
+    def test_base58(self):
+        self.assertEqual(encode_base58(b'\x00\x00\x00\x01'), '1112')
+        self.assertEqual(decode_base58_raw('1112'), b'\x00\x00\x00\x01')
+        self.assertEqual(encode_base58(b''), '')
+        self.assertEqual(decode_base58_raw(''), b'')
+        data = bytes.fromhex('00' * 3 + 'ff' * 61)
+        self.assertEqual(decode_base58_raw(encode_base58(data)), data)
+        h160 = bytes.fromhex('74d691da1574e6b3c192ecfb52cc8984ee7b6c56')
+        self.assertEqual(decode_base58('1BenRpVUFK65JFWcQSuHnJKzc4M8ZP8Eqa'), h160)
+        # wif(38bytes)
+        wif = 'KwDiBf89QgGbjEhKnhXJuH7LrciVrZi3qYjgd9M7rFU73sVHnoWn'
+        self.assertEqual(decode_base58_checksum(wif), b'\x80' + (1).to_bytes(32, 'big') + b'\x01')
+        with self.assertRaises(ValueError):
+            decode_base58_checksum(wif[:-1] + 'o')
+        with self.assertRaises(ValueError):
+            decode_base58_raw('0OIl')
+
+    def test_base58_many(self):
+        items = [b'\x00' + bytes([i]) * 20 for i in range(10)]
+        encoded = encode_base58_many(items)
+        self.assertEqual(decode_base58_many(encoded), items)
+        encoded = encode_base58_many(items, checksum=False)
+        self.assertEqual(decode_base58_many(encoded, checksum=False), items)
+
+    def test_segwit_address(self):
+        h160 = bytes.fromhex('751e76e8199196d454941c45d1b3a323f1433bd6')
+        address = 'bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4'
+        self.assertEqual(encode_segwit_address(0, h160), address)
+        self.assertEqual(decode_segwit_address(address.upper()), (0, h160))
+        xonly = bytes.fromhex('79be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798')
+        address = 'bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqzk5jj0'
+        self.assertEqual(encode_segwit_address(1, xonly), address)
+        self.assertEqual(decode_segwit_address(address), (1, xonly))
+        address = 'tb1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3q0sl5k7'
+        program = bytes.fromhex('1863143c14c5166804bd19203356da136c985678cd4d27a1b8c6329604903262')
+        self.assertEqual(decode_segwit_address(address, testnet=True), (0, program))
+        invalid = [
+            # v1 with bech32 checksum
+            'bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqh2y7hd',
+            # v0 with bech32m checksum
+            'bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kemeawh',
+            # bad checksum
+            'bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t5',
+            # mixed case
+            'bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kV8f3t4',
+            # testnet address for mainnet
+            'tb1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3q0sl5k7',
+        ]
+        for address in invalid:
+            with self.assertRaises(ValueError):
+                decode_segwit_address(address)
+
+    def test_segwit_addresses(self):
+        programs = [(0, bytes([i]) * 20) for i in range(5)] + [(1, bytes([i]) * 32) for i in range(5)]
+        addresses = encode_segwit_addresses(programs, testnet=True)
+        self.assertEqual(decode_segwit_addresses(addresses, testnet=True), programs)
+
     def test_calculate_new_bits(self):
         prev_bits = bytes.fromhex('54d80118')
         time_differential = 302400
@@ -1,7 +1,8 @@
 from typing import List
 
-from helper.helper import bytes_to_bit_field, little_endian_to_int, read_varint
-from merkleTree.merkleTree import MerkleTree
+from src.block.block import HEADER
+from src.helper.helper import Reader, bytes_to_bit_field
+from src.merkleTree.merkleTree import MerkleTree
 
 
 class MerkleBlock:
@@ -45,19 +46,17 @@ class MerkleBlock:
         Takes a byte stream and parses a merkle block. 
         Returns a Merkle Block object
         '''
-        version = little_endian_to_int(s.read(4))
-        prev_block = s.read(32)[::-1]
-        merkle_root = s.read(32)[::-1]
-        timestamp = little_endian_to_int(s.read(4))
-        bits = s.read(4)
-        nonce = s.read(4)
-        total = little_endian_to_int(s.read(4))
-        hashes_len = read_varint(s)
-        hashes = []
-        for _ in range(hashes_len):
-            hashes.append(s.read(32)[::-1])
-        flags_len = read_varint(s)
-        flags = s.read(flags_len)
+        with Reader.of(s) as reader:
+            version, prev_block, merkle_root, timestamp, bits, nonce = \
+                HEADER.unpack(reader.read_view(HEADER.size))
+            prev_block = prev_block[::-1]
+            merkle_root = merkle_root[::-1]
+            total = reader.read_uint32()
+            hashes_len = reader.read_varint()
+            hashes = []
+            for _ in range(hashes_len):
+                hashes.append(reader.read_hash())
+            flags = reader.read_var_bytes()
         return cls(
             version, prev_block, merkle_root, timestamp, bits, nonce,
             total, hashes, flags
@@ -1,10 +1,13 @@
 from io import BytesIO
+import struct
 
-from src.helper.helper import hash256, int_to_little_endian, little_endian_to_int
+from src.helper.helper import Reader, hash256
 
 
 NETWORK_MAGIC = b'\xf9\xbe\xb4\xd9'
 TESTNET_NETWORK_MAGIC = b'\x0b\x11\x09\x07'
+# magic, command, payload length, checksum
+HEADER = struct.Struct('<4s12sI4s')
 
 
 class Envelope:
@@ -25,14 +28,16 @@ class Envelope:
     @classmethod
     def parse(cls, s: BytesIO, testnet=False) -> 'Envelope':
         '''Takes a stream and creates a Envelope'''
-        magic = s.read(4)
+        # s can be socket stream, so header and payload are read at once.
+        header = s.read(HEADER.size)
+        if len(header) != HEADER.size:
+            raise SyntaxError('Header is too short')
+        magic, cmd, payload_len, check_sum = HEADER.unpack(header)
         if testnet and magic != TESTNET_NETWORK_MAGIC:
             raise SyntaxError('Network magic is invalid')
         elif not testnet and magic != NETWORK_MAGIC:
             raise SyntaxError('Netowkr magic is invalid')
-        cmd = s.read(12).strip(b'\x00')
-        payload_len = little_endian_to_int(s.read(4))
-        check_sum = s.read(4)
+        cmd = cmd.strip(b'\x00')
         payload = s.read(payload_len)
         if hash256(payload)[:4] != check_sum:
             raise SyntaxError('CheckSum is invalid')
@@ -40,13 +45,10 @@ class Envelope:
 
     def serialize(self) -> bytes:
         '''Returns the byte serialization of the entire network message'''
-        result = self.magic
-        result += self.command + (b'\x00' * (12 - len(self.command)))
-        result += int_to_little_endian(len(self.payload), 4)
-        result += hash256(self.payload)[:4]
-        result += self.payload
-        return result
-
-    def stream(self) -> BytesIO:
-        '''Returns a stream for parsing the payload'''
-        return BytesIO(self.payload)
+        # struct pads command with b'\x00' to 12 bytes
+        header = HEADER.pack(self.magic, self.command, len(self.payload), hash256(self.payload)[:4])
+        return header + self.payload
+
+    def stream(self) -> Reader:
+        '''Returns a stream(Reader) for parsing the payload'''
+        return Reader(self.payload)
@@ -6,7 +6,7 @@ import time
 from typing import List, Tuple
 
 from src.block.block import Block
-from src.helper.helper import encode_varint, int_to_little_endian, little_endian_to_int, read_varint
+from src.helper.helper import Reader, Writer, int_to_little_endian
 
 TX_DATA_TYPE = 1
 BLOCK_DATA_TYPE = 2
@@ -56,45 +56,45 @@ class VersionMessage(Message):
 
     def serialize(self) -> bytes:
         '''Serialize this message to send over the network'''
-        result = int_to_little_endian(self.version, 4)
-        result += int_to_little_endian(self.services, 8)
-        result += int_to_little_endian(self.timestamp, 8)
+        writer = Writer()
+        writer.write_uint32(self.version)
+        writer.write_uint64(self.services)
+        writer.write_uint64(self.timestamp)
 
-        result += int_to_little_endian(self.receiver_services, 8)
-        result += b'\x00' * 10 + b'\xff\xff' + self.receiver_ip
-        result += self.receiver_port.to_bytes(2, 'big')
+        writer.write_uint64(self.receiver_services)
+        writer.write(b'\x00' * 10 + b'\xff\xff' + self.receiver_ip)
+        writer.write(self.receiver_port.to_bytes(2, 'big'))
 
-        result += int_to_little_endian(self.sender_services, 8)
-        result += b'\x00' * 10 + b'\xff\xff' + self.sender_ip
-        result += self.sender_port.to_bytes(2, 'big')
+        writer.write_uint64(self.sender_services)
+        writer.write(b'\x00' * 10 + b'\xff\xff' + self.sender_ip)
+        writer.write(self.sender_port.to_bytes(2, 'big'))
 
-        result += self.nonce
-        result += encode_varint(len(self.user_agent))
-        result += self.user_agent
-        result += int_to_little_endian(self.latest_block, 4)
-        result += bytes([self.relay])
+        writer.write(self.nonce)
+        writer.write_var_bytes(self.user_agent)
+        writer.write_uint32(self.latest_block)
+        writer.write_uint8(self.relay)
 
-        return result
+        return writer.getvalue()
 
     @classmethod
     def parse(cls, s: BytesIO) -> 'VersionMessage':
-        version = little_endian_to_int(s.read(4))
-        services = little_endian_to_int(s.read(8))
-        timestamp = little_endian_to_int(s.read(8))
-
-        receiver_services = little_endian_to_int(s.read(8))
-        receiver_ip = s.read(16)[-4:]
-        receiver_port = int.from_bytes(s.read(2), 'big')
-
-        sender_services = little_endian_to_int(s.read(8))
-        sender_ip = s.read(16)[-4:]
-        sender_port = int.from_bytes(s.read(2), 'big')
-
-        nonce = s.read(8)
-        user_agent_len = read_varint(s)
-        user_agent = s.read(user_agent_len)
-        latest_block = little_endian_to_int(s.read(4))
-        relay_byte = s.read(1)
+        with Reader.of(s) as reader:
+            version = reader.read_uint32()
+            services = reader.read_uint64()
+            timestamp = reader.read_uint64()
+
+            receiver_services = reader.read_uint64()
+            receiver_ip = reader.read(16)[-4:]
+            receiver_port = int.from_bytes(reader.read_view(2), 'big')
+
+            sender_services = reader.read_uint64()
+            sender_ip = reader.read(16)[-4:]
+            sender_port = int.from_bytes(reader.read_view(2), 'big')
+
+            nonce = reader.read(8)
+            user_agent = reader.read_var_bytes()
+            latest_block = reader.read_uint32()
+            relay_byte = reader.read(1)
         if relay_byte == b'\x01':
             relay = True
         elif relay_byte == b'\x00':
@@ -131,7 +131,8 @@ class PingMessage(Message):
 
     @classmethod
     def parse(cls, s: BytesIO) -> 'PingMessage':
-        nonce = s.read(8)
+        with Reader.of(s) as reader:
+            nonce = reader.read(8)
         return cls(nonce)
 
     def serialize(self) -> bytes:
@@ -146,7 +147,8 @@ class PongMessage(Message):
 
     @classmethod
     def parse(cls, s: BytesIO) -> 'PongMessage':
-        nonce = s.read(8)
+        with Reader.of(s) as reader:
+            nonce = reader.read(8)
         return cls(nonce)
 
     def serialize(self) -> bytes:
@@ -171,10 +173,11 @@ class GetHeadersMessage(Message):
 
     @classmethod
     def parse(cls, s: BytesIO) -> 'GetHeadersMessage':
-        version = little_endian_to_int(s.read(4))
-        num_hashes = read_varint(s)
-        start_block = s.read(32)[::-1]
-        end_block = s.read(32)[::-1]
+        with Reader.of(s) as reader:
+            version = reader.read_uint32()
+            num_hashes = reader.read_varint()
+            start_block = reader.read_hash()
+            end_block = reader.read_hash()
         return cls(
             version,
             num_hashes,
@@ -184,11 +187,12 @@ class GetHeadersMessage(Message):
 
     def serialize(self) -> bytes:
         '''Serialize this message to send over the network.'''
-        result = int_to_little_endian(self.version, 4)
-        result += encode_varint(self.num_hashes)
-        result += self.start_block[::-1]
-        result += self.end_block[::-1]
-        return result
+        writer = Writer()
+        writer.write_uint32(self.version)
+        writer.write_varint(self.num_hashes)
+        writer.write_hash(self.start_block)
+        writer.write_hash(self.end_block)
+        return writer.getvalue()
 
 
 class HeadersMessage(Message):
@@ -200,22 +204,23 @@ class HeadersMessage(Message):
     @classmethod
     def parse(cls, s: BytesIO) -> 'HeadersMessage':
         '''Returns Block Headers'''
-        num_block = read_varint(s)
-        blocks: List[Block] = []
-        for _ in range(num_block):
-            blocks.append(Block.parse(s))
-            num_txs = read_varint(s)
-            if num_txs != 0:
-                raise SyntaxError('Number of txs not 0')
+        with Reader.of(s) as reader:
+            num_block = reader.read_varint()
+            blocks: List[Block] = []
+            for _ in range(num_block):
+                blocks.append(Block.read(reader))
+                num_txs = reader.read_varint()
+                if num_txs != 0:
+                    raise SyntaxError('Number of txs not 0')
         return cls(blocks)
 
     def serialize(self) -> bytes:
-        result = b''
-        result += encode_varint(len(self.blocks))
+        writer = Writer()
+        writer.write_varint(len(self.blocks))
         for b in self.blocks:
-            result += b.serialize()
-            result += b'\x00'
-        return result
+            b.write(writer)
+            writer.write_uint8(0)
+        return writer.getvalue()
 
 
 class GenericMessage(Message):
@@ -238,17 +243,19 @@ class GetDataMessage(Message):
 
     @classmethod
     def parse(cls, s: BytesIO) -> 'GetDataMessage':
-        data_len = read_varint(s)
         me = cls()
-        for _ in range(data_len):
-            data_type = little_endian_to_int(s.read(4))
-            identifier = s.read(32)[::-1]
-            me.add_data(data_type, identifier)
+        with Reader.of(s) as reader:
+            data_len = reader.read_varint()
+            for _ in range(data_len):
+                data_type = reader.read_uint32()
+                identifier = reader.read_hash()
+                me.add_data(data_type, identifier)
         return me
 
     def serialize(self) -> bytes:
-        result = encode_varint(len(self.data))
+        writer = Writer()
+        writer.write_varint(len(self.data))
         for (data_type, identifier) in self.data:
-            result += int_to_little_endian(data_type, 4)
-            result += identifier[::-1]
-        return result
+            writer.write_uint32(data_type)
+            writer.write_hash(identifier)
+        return writer.getvalue()
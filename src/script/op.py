@@ -2,7 +2,7 @@
 
 import hashlib
 
-from src.ecdsa.s256Ecc import S256Point, Signature
+from src.ecdsa.s256Ecc import SIG_CACHE, S256Point, Signature
 from src.helper.helper import (
     hash160,
     hash256,
@@ -647,12 +647,34 @@ def op_hash256(stack):
     return True
 
 
+def check_signature(sec, der, z):
+    '''verify der signature with sec public key, SIG_CACHE is used first'''
+    if SIG_CACHE.contains(sec, z, der):
+        return True
+    pub_key = S256Point.parse_sec(sec)
+    sig = Signature.parse_der(der)
+    ok = pub_key.verify(z, sig)
+    if ok:
+        SIG_CACHE.add(sec, z, der)
+    return ok
+
+
+def signature_hash(z, signature):
+    '''
+    z of the signature. z is the hash itself,
+    or a function of hash type(the last byte of each signature)
+    '''
+    if callable(z):
+        return z(signature[-1])
+    return z
+
+
 def op_checksig(stack, z):
     if len(stack) < 2:
         return False
-    pub_key = S256Point.parse_sec(stack.pop())
-    sig = Signature.parse_der(stack.pop()[:-1])
-    ok = pub_key.verify(z, sig)
+    sec = stack.pop()
+    signature = stack.pop()
+    ok = bool(signature) and check_signature(sec, signature[:-1], signature_hash(z, signature))
     if ok:
         stack.append(encode_num(1))
     else:
@@ -676,27 +698,33 @@ def op_checkmultisig(stack, z):
     m = decode_num(stack.pop())
     if len(stack) < m + 1:
         return False
-    der_signatures = []
+    signatures = []
     for _ in range(m):
-        der_signatures.append(stack.pop()[:-1])
+        signatures.append(stack.pop())
     stack.pop()
+    if not all(signatures):
+        return False
     try:
-        # parse all the points
-        pubkeys = [S256Point.parse_sec(sec) for sec in sec_pubkeys]
-        # parse all the signatures
-        signatures = [Signature.parse_der(der) for der in der_signatures]
-        # loop through the signatures
+        # parse all the points and signatures (only for checking encoding)
+        for sec in sec_pubkeys:
+            S256Point.parse_sec(sec)
         for signature in signatures:
-            # if we have no more points, signatures are no good
-            if len(pubkeys) == 0:
-                return False
+            Signature.parse_der(signature[:-1])
+        pubkeys = sec_pubkeys[:]
+        # loop through the signatures, each is signed with its own hash type
+        for signature in signatures:
+            der = signature[:-1]
+            sig_z = signature_hash(z, signature)
             # we loop until we find the point which works with this signature
             while pubkeys:
                 # get the current point from the list of points
-                pubkey = pubkeys.pop(0)
+                sec = pubkeys.pop(0)
                 # we check if this signature goes with the current point
-                if pubkey.verify(z, signature):
+                if check_signature(sec, der, sig_z):
                     break
+            else:
+                # no point is left for this signature
+                return False
         # the signatures are valid, so push a 1 to the stack
         stack.append(encode_num(1))
     except (ValueError, SyntaxError):
@@ -1,5 +1,6 @@
 from unittest import TestCase
 
+from src.ecdsa.s256Ecc import SIG_CACHE
 from src.script.op import (
     op_checkmultisig,
     op_hash160,
@@ -27,6 +28,21 @@ class OpTest(TestCase):
         self.assertTrue(op_checksig(stack, z))
         self.assertEqual(decode_num(stack[0]), 1)
 
+    def test_op_checksig_cache(self):
+        SIG_CACHE.clear()
+        z = 0x7c076ff316692a3d7eb3c3bb0f8b1488cf72e1afcd929e29307032997a838a3d
+        sec = bytes.fromhex(
+            '04887387e452b8eacc4acfde10d9aaf7f6d9a0f975aabb10d006e4da568744d06c61de6d95231cd89026e286df3b6ae4a894a3378e393e93a0f45b666329a0ae34')
+        sig = bytes.fromhex(
+            '3045022000eff69ef2b1bd93a66ed5219add4fb51e11a840f404876325a1e8ffe0529a2c022100c7207fee197d27c618aea621406f6bf5ef6fca38681d82b2f06fddbdce6feab601')
+        self.assertFalse(op_checksig([sig, sec], z + 1))
+        self.assertTrue(op_checksig([sig, sec], z))
+        self.assertEqual((SIG_CACHE.hits, SIG_CACHE.misses), (0, 2))
+        self.assertTrue(op_checksig([sig, sec], z))
+        self.assertEqual((SIG_CACHE.hits, SIG_CACHE.misses), (1, 2))
+        self.assertFalse(op_checksig([sig, sec], z + 1))
+        self.assertEqual((SIG_CACHE.hits, SIG_CACHE.misses), (1, 3))
+
     def test_op_checkmultisig(self):
         z = 0xe71bfa115715d6fd33796948126f40a8cdd39f187e4afb03896795189fe1423c
         sig1 = bytes.fromhex(
@@ -3,7 +3,7 @@ from logging import getLogger
 from typing import List, Union
 
 from src.helper.helper import (
-    encode_varint, hash160, int_to_little_endian, read_varint, little_endian_to_int)
+    Reader, Tracked, TrackedList, Writer, encode_varint, hash160, int_to_little_endian)
 from src.script.op import (
     OP_CODE_FUNCTIONS, OP_CODE_NAMES, op_equal, op_hash160, op_verify)
 
@@ -26,16 +26,97 @@ def p2sh_script(h160: bytes) -> 'Script':
     return Script([0xa9, h160, 0x87])
 
 
-class Script:
-    def __init__(self, cmds: List[Union[int, bytes]] = None):
-        if cmds is None:
-            self.cmds = []
+def p2wpkh_script(h160: bytes) -> 'Script':
+    '''
+    Takes a hash160 and returns the p2wpkh ScriptPubKey
+    (OP_0 | h160)
+    '''
+    return Script([0x00, h160])
+
+
+def parse_cmds(raw: bytes, start: int, end: int) -> List[Union[int, bytes]]:
+    '''Returns the cmds of script which is raw[start:end]'''
+    # initialize the cmds array
+    cmds = []
+    append = cmds.append
+    # position of the byte we are reading
+    count = start
+    # loop until we've read end
+    while count < end:
+        # get the current byte
+        current_byte = raw[count]
+        count += 1
+        # The next opcode bytes is data to be pushed onto the stack
+        if 0 < current_byte < 76:
+            append(raw[count:count + current_byte])
+            count += current_byte
+        # Opcode is stored in cmds. and will be ran runtime.
+        elif current_byte > 77 or current_byte == 0:
+            append(current_byte)
+        # The next a byte contains the number of bytes to be pushed onto the stack.
+        # op_pushdata1
+        elif current_byte == 76:
+            if count + 1 > end:
+                raise SyntaxError('parsing script failed')
+            n = raw[count]
+            append(raw[count + 1:count + 1 + n])
+            count += n + 1
+        # The next two bytes contains the number of bytes to be pushed onto the stack.
+        # op_pushdata2
         else:
-            self.cmds = cmds
+            if count + 2 > end:
+                raise SyntaxError('parsing script failed')
+            n = raw[count] | raw[count + 1] << 8
+            append(raw[count + 2:count + 2 + n])
+            count += n + 2
+    if count != end:
+        raise SyntaxError('parsing script failed')
+    return cmds
+
+
+class Script(Tracked):
+    # changes of cmds are tracked by TrackedList(and cmds setter), not by fields
+    __setattr__ = object.__setattr__
+
+    def __init__(self, cmds: List[Union[int, bytes]] = None, raw: bytes = None):
+        '''
+        raw: serialization(no prepended length) of parsed script.
+        cmds are decoded from raw when they are needed.
+        cmds are copied, so changing the given list does not change this script.
+        '''
+        if cmds is not None or raw is None:
+            cmds = TrackedList(cmds or (), self)
+        self._cmds = cmds
+        self.raw = raw
+
+    @property
+    def cmds(self) -> List[Union[int, bytes]]:
+        '''cmds which can be modified by caller(changes are tracked)'''
+        cmds = self.decode()
+        if type(cmds) is not TrackedList:
+            cmds = TrackedList(cmds, self)
+            self._cmds = cmds
+        return cmds
+
+    @cmds.setter
+    def cmds(self, cmds: List[Union[int, bytes]]) -> None:
+        self._cmds = TrackedList(cmds, self)
+        self.changed()
+
+    def decode(self) -> List[Union[int, bytes]]:
+        '''Returns cmds(decoded once) for reading only'''
+        if self._cmds is None:
+            self._cmds = parse_cmds(self.raw, 0, len(self.raw))
+        return self._cmds
+
+    def clear_cache(self) -> None:
+        # raw is the only data until cmds are decoded
+        if self._cmds is not None:
+            self.raw = None
 
     def __repr__(self):
         result = []
-        for cmd in self.cmds:
+        for cmd in self.decode():
             if type(cmd) == int:
                 if OP_CODE_NAMES.get(cmd):
                     name = OP_CODE_NAMES.get(cmd)
@@ -47,73 +128,64 @@ class Script:
         return ' '.join(result)
 
     def __add__(self, other: 'Script') -> 'Script':
-        return Script(self.cmds + other.cmds)
+        return Script(self.decode() + other.decode())
 
     @classmethod
     def parse(cls, s: BytesIO) -> 'Script':
-        # get the length of the entire field
-        length = read_varint(s)
-        # initialize the cmds array
-        cmds = []
-        # initialize the number of bytes we've read to 0
-        count = 0
-        # loop until we've read length bytes
-        while count < length:
-            # get the current byte
-            current = s.read(1)
-            # increment the bytes we've read
-            count += 1
-            # convert the current byte to an integer
-            current_byte = current[0]
-            # The next opcode bytes is data to be pushed onto the stack
-            if current_byte >= 1 and current_byte <= 75:
-                n = current_byte
-                cmds.append(s.read(n))
-                count += n
-            # The next a byte contains the number of bytes to be pushed onto the stack.
-            # op_pushdata1
-            elif current_byte == 76:
-                data_length = little_endian_to_int(s.read(1))
-                cmds.append(s.read(data_length))
-                count += data_length + 1
-            # The next two bytes contains the number of bytes to be pushed onto the stack.
-            # op_pushdata2
-            elif current_byte == 77:
-                data_length = little_endian_to_int(s.read(2))
-                cmds.append(s.read(data_length))
-                count += data_length + 2
-            # Opcode is stored in cmds. and will be ran runtime.
-            else:
-                op_code = current_byte
-                cmds.append(op_code)
-        if count != length:
-            raise SyntaxError('parsing script failed')
-        return cls(cmds)
+        '''Takes a stream(or Reader) and parses the script prefixed with its length'''
+        with Reader.of(s) as reader:
+            return cls.read(reader)
+
+    @classmethod
+    def read(cls, reader: Reader) -> 'Script':
+        return cls.read_rest(reader, reader.read_uint8())
+
+    @classmethod
+    def read_rest(cls, reader: Reader, first: int) -> 'Script':
+        '''
+        Parses the script whose first byte of length is already read(with other fields)
+        1 byte length is the most common case
+        '''
+        if first < 0xfd:
+            length = first
+        else:
+            reader.pos -= 1
+            length = reader.read_varint()
+        return cls(raw=reader.read(length))
+
+    @classmethod
+    def parse_raw(cls, raw: bytes) -> 'Script':
+        '''Parses the script bytes(no prepended length), cmds are decoded on access'''
+        return cls(raw=bytes(raw))
 
     def raw_serialize(self) -> bytes:
+        # parsed(or already serialized) script which is not modified is the same with raw
+        if self.raw is not None:
+            return self.raw
         # initialize what we'll send back
-        result = b''
+        result = bytearray()
         # go through each cmd
-        for cmd in self.cmds:
+        for cmd in self._cmds:
             # if the cmd is an integer, it's an opcode
             if type(cmd) == int:
-                result += int_to_little_endian(cmd, 1)
+                result.append(cmd)
             else:
                 # otherwise, this is an element.(bytes)
                 length = len(cmd)
                 # for large lengths, we have to use a pushdata opcode
                 if length < 76:
-                    result += int_to_little_endian(length, 1)
+                    result.append(length)
                 elif length < 256:
-                    result += int_to_little_endian(76, 1)
-                    result += int_to_little_endian(length, 1)
+                    result.append(76)
+                    result.append(length)
                 elif length < 520:
-                    result += int_to_little_endian(77, 1)
+                    result.append(77)
                     result += int_to_little_endian(length, 2)
                 else:
                     raise ValueError('too long an cmd')
                 result += cmd
-        return result
+        self.raw = bytes(result)
+        return self.raw
 
     def serialize(self) -> bytes:
         # get the raw serialization (no prepended length)
@@ -121,8 +193,12 @@ class Script:
         total = len(result)
         return encode_varint(total) + result
 
+    def write(self, writer: Writer) -> None:
+        '''Appends the serialization(with prepended length) to writer'''
+        writer.write_var_bytes(self.raw_serialize())
+
     def evaluate(self, z) -> bool:
-        cmds = self.cmds[:]
+        cmds = self.decode()[:]
         stack = []
         altstack = []
         while len(cmds) > 0:
@@ -171,9 +247,7 @@ class Script:
                     if not op_verify(stack):
                         LOGGER.info('bad p2sh h160')
                         return False
-                    redeem_script = encode_varint(len(cmd)) + cmd
-                    stream = BytesIO(redeem_script)
-                    cmds.extend(Script.parse(stream).cmds)
+                    cmds.extend(Script.parse_raw(cmd).cmds)
         if len(stack) == 0:
             return False
         if stack.pop() == b'':
@@ -185,31 +259,52 @@ class Script:
         Returns whether this follows the
         OP_DUP OP_HASH160 <20 byte hash> OP_EQUALVERIFY OP_CHECKSIG pattern.
         '''
-        if len(self.cmds) != 5:
+        cmds = self.decode()
+        if len(cmds) != 5:
             return False
-        if OP_CODE_NAMES[self.cmds[0]] != "OP_DUP":
+        if OP_CODE_NAMES[cmds[0]] != "OP_DUP":
             return False
-        if OP_CODE_NAMES[self.cmds[1]] != "OP_HASH160":
+        if OP_CODE_NAMES[cmds[1]] != "OP_HASH160":
             return False
-        if type(self.cmds[2]) != bytes or len(self.cmds[2]) != 20:
+        if type(cmds[2]) != bytes or len(cmds[2]) != 20:
             return False
-        if OP_CODE_NAMES[self.cmds[3]] != "OP_EQUALVERIFY":
+        if OP_CODE_NAMES[cmds[3]] != "OP_EQUALVERIFY":
             return False
-        if OP_CODE_NAMES[self.cmds[4]] != "OP_CHECKSIG":
+        if OP_CODE_NAMES[cmds[4]] != "OP_CHECKSIG":
             return False
         return True
 
+    def is_p2wpkh_script_pubkey(self):
+        '''
+        Returns whether this follows the
+        OP_0 <20 bytes hash> pattern.
+        '''
+        cmds = self.decode()
+        return len(cmds) == 2 and cmds[0] == 0x00 \
+            and type(cmds[1]) == bytes and len(cmds[1]) == 20
+
+    def is_witness_program(self):
+        '''
+        Returns whether this follows the
+        OP_0..OP_16 <2..40 bytes program> pattern(BIP141).
+        '''
+        raw = self.raw_serialize()
+        return 4 <= len(raw) <= 42 \
+            and (raw[0] == 0x00 or 0x51 <= raw[0] <= 0x60) \
+            and raw[1] + 2 == len(raw)
+
     def is_p2sh_script_pubkey(self):
         '''
         Returns whether this follows the
         OP_HASH160 <20 bytes hash> OP_EQUAL pattern.
         '''
-        if len(self.cmds) != 3:
+        cmds = self.decode()
+        if len(cmds) != 3:
             return False
-        if OP_CODE_NAMES[self.cmds[0]] != 'OP_HASH160':
+        if OP_CODE_NAMES[cmds[0]] != 'OP_HASH160':
             return False
-        if type(self.cmds[1]) != bytes or len(self.cmds[1]) != 20:
+        if type(cmds[1]) != bytes or len(cmds[1]) != 20:
             return False
-        if OP_CODE_NAMES[self.cmds[2]] != 'OP_EQUAL':
+        if OP_CODE_NAMES[cmds[2]] != 'OP_EQUAL':
             return False
         return True
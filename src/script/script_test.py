@@ -1,5 +1,6 @@
 from unittest import TestCase
 from io import BytesIO
+import pickle
 
 from src.script.script import (Script)
 
@@ -21,3 +22,11 @@ class ScriptTest(TestCase):
         script_pubkey = BytesIO(bytes.fromhex(want))
         script = Script.parse(script_pubkey)
         self.assertEqual(script.serialize().hex(), want)
+
+    def test_pickle(self):
+        script_pubkey = Script.parse(BytesIO(bytes.fromhex('1976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac')))
+        self.assertEqual(len(script_pubkey.cmds), 5)
+        copied = pickle.loads(pickle.dumps(script_pubkey))
+        self.assertEqual(copied.cmds, script_pubkey.cmds)
+        copied.cmds[2] = bytes(20)
+        self.assertEqual(copied.serialize().hex(), '1976a914{}88ac'.format('00' * 20))
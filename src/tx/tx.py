@@ -1,21 +1,244 @@
 from codecs import StreamReader
+from concurrent.futures import Executor
 from io import BytesIO
+import hashlib
 import json
-from typing import Dict, List
+import struct
+import weakref
+from typing import Callable, Dict, List, Tuple
 import requests
 
 from src.ecdsa.s256Ecc import B, PrivateKey, Signature
-from src.helper.helper import SIGHASH_ALL, encode_varint, hash256, int_to_little_endian, little_endian_to_int, read_varint
-from src.script.script import Script
+from src.helper.helper import (
+    SIGHASH_ALL, SIGHASH_ANYONECANPAY, SIGHASH_NONE, SIGHASH_SINGLE, UINT32, UINT64,
+    Reader, Tracked, TrackedList, Writer, encode_varint, hash160, hash256, little_endian_to_int
+)
+from src.script.script import Script, p2pkh_script
 
 
-class TxIn:
+# previous tx hash(little endian), previous index, first byte of script_sig length
+TX_IN_HEAD = struct.Struct('<32sIB')
+# amount, first byte of script_pubkey length
+TX_OUT_HEAD = struct.Struct('<QB')
+# output before the signed one in SIGHASH_SINGLE: amount -1 and empty script_pubkey
+BLANK_OUTPUT = b'\xff' * 8 + b'\x00'
+# segwit marker and flag after version
+SEGWIT_MARKER = b'\x00\x01'
+
+
+def verify_script(job: Tuple[Script, Script, Callable[[int], int]]) -> bool:
+    '''
+    job: (script_sig, script_pubkey, z) from Tx.verify_input_job
+    (None if the input is invalid before evaluating scripts)
+    It is module level function, so job can be sent to other process.
+    '''
+    if job is None:
+        return False
+    script_sig, script_pubkey, z = job
+    # combine the current ScriptSig and the previous ScriptPubKey
+    script = script_sig + script_pubkey
+    # evaluate the combined script
+    return script.evaluate(z)
+
+
+class PrevoutView:
+    '''
+    Previous outputs of all inputs of a Tx.
+    They are resolved with one prevouts(batch) call of the prevout source.
+    '''
+
+    def __init__(self, tx: 'Tx'):
+        # where the outputs are from, the view is not used for other source or network
+        self.source = tx.prevout_source
+        self.testnet = tx.testnet
+        source = self.source
+        if source is None:
+            source = TxFetcher
+        outpoints = [(tx_in.prev_tx, tx_in.prev_index) for tx_in in tx.tx_ins]
+        found = source.prevouts(outpoints, tx.testnet)
+        try:
+            self.prevouts = [found[outpoint] for outpoint in outpoints]
+        except KeyError as e:
+            txid, index = e.args[0]
+            raise ValueError('unknown outpoint {}:{}'.format(txid.hex(), index)) from None
+
+    def __len__(self) -> int:
+        return len(self.prevouts)
+
+    def __getitem__(self, input_index: int) -> 'TxOut':
+        return self.prevouts[input_index]
+
+    def amount(self, input_index: int) -> int:
+        return self.prevouts[input_index].amount
+
+    def script_pubkey(self, input_index: int) -> Script:
+        return self.prevouts[input_index].script_pubkey
+
+    def total(self) -> int:
+        '''Sum of the amounts of all inputs'''
+        return sum(prevout.amount for prevout in self.prevouts)
+
+
+class SigHasher:
+    '''
+    Computes signature hashes of the inputs of a Tx.
+    Inputs(with empty script_sig) and outputs are serialized once and shared by every input.
+    Legacy hashed bytes still grow with the number of inputs(it is how legacy sighash is defined),
+    but nothing is rebuilt in python for each input.
+    Segwit(BIP143) hashes reuse hashPrevouts, hashSequence and hashOutputs, so they are linear.
+    '''
+    # prev_tx(32) + prev_index(4) + empty script_sig(1) + sequence(4)
+    INPUT_SIZE = 41
+
+    def __init__(self, tx: 'Tx'):
+        self.version = UINT32.pack(tx.version)
+        self.locktime = UINT32.pack(tx.locktime)
+        writer = Writer()
+        writer.write_varint(len(tx.tx_ins))
+        for tx_in in tx.tx_ins:
+            writer.write_hash(tx_in.prev_tx)
+            writer.write_uint32(tx_in.prev_index)
+            writer.write_uint8(0)
+            writer.write_uint32(tx_in.sequence)
+        self.inputs = writer.getvalue()
+        # varint of the number of inputs is kept in front of inputs
+        self.inputs_start = len(self.inputs) - self.INPUT_SIZE * len(tx.tx_ins)
+        self.inputs_no_sequence = None
+        self.outputs = [tx_out.serialize() for tx_out in tx.tx_outs]
+        self.outputs_all = encode_varint(len(self.outputs)) + b''.join(self.outputs)
+        self.hash_prevouts = None
+        self.hash_sequence = None
+        self.hash_outputs = None
+
+    def other_inputs(self, hash_type: int) -> memoryview:
+        '''SIGHASH_NONE and SIGHASH_SINGLE let other inputs change their sequence(it is set to 0)'''
+        if hash_type & 0x1f not in (SIGHASH_NONE, SIGHASH_SINGLE):
+            return memoryview(self.inputs)
+        if self.inputs_no_sequence is None:
+            inputs = bytearray(self.inputs)
+            for end in range(len(inputs), self.inputs_start, -self.INPUT_SIZE):
+                inputs[end - 4:end] = bytes(4)
+            self.inputs_no_sequence = bytes(inputs)
+        return memoryview(self.inputs_no_sequence)
+
+    def sig_hash(self, input_index: int, script_code: Script, hash_type: int = SIGHASH_ALL) -> int:
+        '''
+        Returns the integer representation of the hash that needs to get signed for index input_index.
+        script_code: ScriptPubkey of the previous output(or RedeemScript)
+        '''
+        base_type = hash_type & 0x1f
+        if base_type == SIGHASH_SINGLE and input_index >= len(self.outputs):
+            # no output to sign, consensus rule keeps the historical result 1
+            return 1
+        start = self.inputs_start + self.INPUT_SIZE * input_index
+        end = start + self.INPUT_SIZE
+        h = hashlib.sha256(self.version)
+        # signed input has script_code instead of empty script_sig
+        signed = self.inputs[start:start + 36] + script_code.serialize() + self.inputs[end - 4:end]
+        if hash_type & SIGHASH_ANYONECANPAY:
+            h.update(b'\x01')
+            h.update(signed)
+        else:
+            inputs = self.other_inputs(hash_type)
+            h.update(inputs[:start])
+            h.update(signed)
+            h.update(inputs[end:])
+        if base_type == SIGHASH_NONE:
+            h.update(b'\x00')
+        elif base_type == SIGHASH_SINGLE:
+            h.update(encode_varint(input_index + 1))
+            h.update(BLANK_OUTPUT * input_index)
+            h.update(self.outputs[input_index])
+        else:
+            h.update(self.outputs_all)
+        h.update(self.locktime)
+        h.update(UINT32.pack(hash_type))
+        z = hashlib.sha256(h.digest()).digest()
+        return int.from_bytes(z, 'big')
+
+    def input_parts(self, start: int, end: int) -> bytes:
+        '''joins inputs[start:end] of every input(0:36 is outpoint, 37:41 is sequence)'''
+        inputs = self.inputs
+        size = self.INPUT_SIZE
+        return b''.join(inputs[pos + start:pos + end] for pos in range(self.inputs_start, len(inputs), size))
+
+    def segwit_sig_hash(
+        self, input_index: int, script_code: Script, amount: int, hash_type: int = SIGHASH_ALL
+    ) -> int:
+        '''
+        Returns the integer representation of BIP143 signature hash for index input_index.
+        script_code: p2pkh script of p2wpkh key hash(or WitnessScript)
+        amount: amount of the previous output
+        '''
+        base_type = hash_type & 0x1f
+        anyone_can_pay = hash_type & SIGHASH_ANYONECANPAY
+        hash_prevouts = hash_sequence = hash_outputs = bytes(32)
+        if not anyone_can_pay:
+            if self.hash_prevouts is None:
+                self.hash_prevouts = hash256(self.input_parts(0, 36))
+            hash_prevouts = self.hash_prevouts
+            if base_type not in (SIGHASH_NONE, SIGHASH_SINGLE):
+                if self.hash_sequence is None:
+                    self.hash_sequence = hash256(self.input_parts(37, 41))
+                hash_sequence = self.hash_sequence
+        if base_type not in (SIGHASH_NONE, SIGHASH_SINGLE):
+            if self.hash_outputs is None:
+                self.hash_outputs = hash256(b''.join(self.outputs))
+            hash_outputs = self.hash_outputs
+        elif base_type == SIGHASH_SINGLE and input_index < len(self.outputs):
+            hash_outputs = hash256(self.outputs[input_index])
+        start = self.inputs_start + self.INPUT_SIZE * input_index
+        end = start + self.INPUT_SIZE
+        preimage = b''.join((
+            self.version, hash_prevouts, hash_sequence,
+            self.inputs[start:start + 36], script_code.serialize(),
+            UINT64.pack(amount), self.inputs[end - 4:end],
+            hash_outputs, self.locktime, UINT32.pack(hash_type),
+        ))
+        return int.from_bytes(hash256(preimage), 'big')
+
+    def input_sig_hash(self, input_index: int, script_code: Script, amount: int = None) -> 'InputSigHash':
+        '''z of the input for any hash type, amount is given for segwit(BIP143) input'''
+        return InputSigHash(self, input_index, script_code, amount)
+
+
+class InputSigHash:
+    '''
+    z of one input as a function of hash type, it is given to Script.evaluate as z.
+    Each signature is checked with z of its own hash type, and z is computed once for each type.
+    It can be sent to other process with SigHasher.
+    '''
+
+    def __init__(self, hasher: SigHasher, input_index: int, script_code: Script, amount: int = None):
+        self.hasher = hasher
+        self.input_index = input_index
+        self.script_code = script_code
+        self.amount = amount
+        self.hashes = {}
+
+    def __call__(self, hash_type: int) -> int:
+        z = self.hashes.get(hash_type)
+        if z is None:
+            if self.amount is None:
+                z = self.hasher.sig_hash(self.input_index, self.script_code, hash_type)
+            else:
+                z = self.hasher.segwit_sig_hash(self.input_index, self.script_code, self.amount, hash_type)
+            self.hashes[hash_type] = z
+        return z
+
+
+class TxIn(Tracked):
     '''
     prev_tx : previous transaction's hased serialization.
     prev_index: previous transaction's output index.
+    witness: list of elements(bytes) for segwit input, it is serialized after all outputs.
     '''
+    tracked_fields = frozenset(('prev_tx', 'prev_index', 'script_sig', 'sequence'))
 
-    def __init__(self, prev_tx: bytes, prev_index: int, script_sig: Script = None, sequence: int = 0xffffffff):
+    def __init__(
+        self, prev_tx: bytes, prev_index: int, script_sig: Script = None,
+        sequence: int = 0xffffffff, witness: List[bytes] = None
+    ):
         self.prev_tx = prev_tx
         self.prev_index = prev_index
         if script_sig is None:
@@ -23,6 +246,8 @@ class TxIn:
         else:
             self.script_sig = script_sig
         self.sequence = sequence
+        # most inputs have no witness, the list is made on first access
+        self._witness = TrackedList(witness, self) if witness else None
 
     def __repr__(self):
         return '{}:{}'.format(
@@ -32,44 +257,85 @@ class TxIn:
 
     @classmethod
     def parse(cls, s: BytesIO) -> 'TxIn':
-        prev_tx = s.read(32)[::-1]
-        prev_index = little_endian_to_int(s.read(4))
-        script_sig = Script.parse(s)
-        sequence = little_endian_to_int(s.read(4))
-        return cls(prev_tx, prev_index, script_sig, sequence)
+        with Reader.of(s) as reader:
+            return cls.read(reader)
+
+    @classmethod
+    def read(cls, reader: Reader) -> 'TxIn':
+        prev_tx, prev_index, first = reader.read_struct(TX_IN_HEAD)
+        script_sig = Script.read_rest(reader, first)
+        sequence = reader.read_uint32()
+        return cls(prev_tx[::-1], prev_index, script_sig, sequence)
 
     def serialize(self) -> bytes:
-        result = self.prev_tx[::-1]  # reverse previous transaction bytes
-        result += int_to_little_endian(self.prev_index, 4)
-        result += self.script_sig.serialize()
-        result += int_to_little_endian(self.sequence, 4)
-        return result
+        writer = Writer()
+        self.write(writer)
+        return writer.getvalue()
+
+    def write(self, writer: Writer) -> None:
+        writer.write_hash(self.prev_tx)  # reverse previous transaction bytes
+        writer.write_uint32(self.prev_index)
+        self.script_sig.write(writer)
+        writer.write_uint32(self.sequence)
+
+    @property
+    def witness(self) -> List[bytes]:
+        if self._witness is None:
+            self._witness = TrackedList((), self)
+        return self._witness
+
+    @witness.setter
+    def witness(self, witness: List[bytes]) -> None:
+        self._witness = TrackedList(witness, self)
+        self.changed()
+
+    def has_witness(self) -> bool:
+        return bool(self._witness)
+
+    def read_witness(self, reader: Reader) -> None:
+        items = [reader.read_var_bytes() for _ in range(reader.read_varint())]
+        if items:
+            self._witness = TrackedList(items, self, tracked=True)
+
+    def write_witness(self, writer: Writer) -> None:
+        witness = self._witness or ()
+        writer.write_varint(len(witness))
+        for item in witness:
+            writer.write_var_bytes(item)
 
     def fetch_tx(self, testnet=False) -> 'Tx':
         return TxFetcher.fetch(self.prev_tx.hex(), testnet=testnet)
 
-    def value(self, testnet=False) -> int:
+    def prevout(self, testnet=False, source=None) -> 'TxOut':
+        '''
+        Returns the previous output(or an object with amount and script_pubkey).
+        source: prevout source(ex. UtxoStore), TxFetcher if it is None
+        '''
+        if source is None:
+            source = TxFetcher
+        return source.prevout(self.prev_tx, self.prev_index, testnet)
+
+    def value(self, testnet=False, source=None) -> int:
         '''
         Get the output value by looking up the tx hash.
         Returns the amount in satoshi
         '''
-        tx = self.fetch_tx(testnet=testnet)
-        return tx.tx_outs[self.prev_index].amount
+        return self.prevout(testnet, source).amount
 
-    def script_pubkey(self, testnet=False) -> Script:
+    def script_pubkey(self, testnet=False, source=None) -> Script:
         '''
         Get the ScriptPubKey by looking up the tx hash.
         Returns a script object
         '''
-        tx = self.fetch_tx(testnet=testnet)
-        return tx.tx_outs[self.prev_index].script_pubkey
+        return self.prevout(testnet, source).script_pubkey
 
 
-class TxOut:
+class TxOut(Tracked):
     '''
     amount is 8bytes. The unit of this is satoshi.(1 satoshi = 10^-8 bitcoin)
     So, maximum amount is 21 million bitcoins.
     '''
+    tracked_fields = frozenset(('amount', 'script_pubkey'))
 
     def __init__(self, amount: int, script_pubkey: Script):
         self.amount = amount
@@ -80,28 +346,61 @@ class TxOut:
 
     @classmethod
     def parse(cls, s: BytesIO) -> 'TxOut':
-        amount = little_endian_to_int(s.read(8))
-        script_key = Script.parse(s)
+        with Reader.of(s) as reader:
+            return cls.read(reader)
+
+    @classmethod
+    def read(cls, reader: Reader) -> 'TxOut':
+        amount, first = reader.read_struct(TX_OUT_HEAD)
+        script_key = Script.read_rest(reader, first)
         return cls(amount, script_key)
 
     def serialize(self) -> bytes:
         '''Return the bytes serialization of the transaction outpute'''
-        result = int_to_little_endian(self.amount, 8)
-        result += self.script_pubkey.serialize()
-        return result
+        writer = Writer()
+        self.write(writer)
+        return writer.getvalue()
+
+    def write(self, writer: Writer) -> None:
+        writer.write_uint64(self.amount)
+        self.script_pubkey.write(writer)
+
 
+class Tx(Tracked):
+    '''
+    Tx caches its serialization and hash.
+    Parsed Tx uses the raw bytes it is parsed from, and builds tx_ins/tx_outs on first access.
+    Any change of fields, inputs, outputs or their scripts clears the cache.
+    Tx is serialized with segwit marker and witnesses(BIP144) if any input has witness.
+    prevout_source: where previous outputs are looked up(ex. UtxoStore), TxFetcher if it is None.
+    '''
+    tracked_fields = frozenset(('version', 'locktime'))
+    has_cache = True
 
-class Tx:
     def __init__(
         self, version: int,
         tx_ins: List['TxIn'], tx_outs: List['TxOut'],
         locktime: int, testnet=False
     ):
+        # (data, start, end), data[start:end] is serialization of this Tx
+        self.raw = None
+        # position of witnesses in raw data(None if raw has no witness)
+        self.witness_pos = None
+        self.hash_cache = None
+        self.witness_hash_cache = None
+        self.sig_hasher_cache = None
+        self.prevout_view_cache = None
+        # (data, count, pos) for building tx_ins, tx_outs on first access
+        self.tx_ins_source = None
+        self.tx_outs_source = None
+        # (data, pos) of witnesses for tx_ins
+        self.witness_source = None
         self.version = version
-        self.tx_ins = tx_ins
-        self.tx_outs = tx_outs
+        self._tx_ins = TrackedList(tx_ins or (), self)
+        self._tx_outs = TrackedList(tx_outs or (), self)
         self.locktime = locktime
         self.testnet = testnet
+        self.prevout_source = None
 
     def __repr__(self) -> str:
         tx_ins = ''
@@ -118,13 +417,141 @@ class Tx:
             self.locktime
         )
 
+    def clear_cache(self) -> None:
+        self.raw = None
+        self.witness_pos = None
+        self.hash_cache = None
+        self.witness_hash_cache = None
+        self.sig_hasher_cache = None
+        self.prevout_view_cache = None
+
+    @property
+    def tx_ins(self) -> List['TxIn']:
+        if self.tx_ins_source is not None:
+            tx_ins = self.load(TxIn, self.tx_ins_source)
+            if self.witness_source is not None:
+                data, pos = self.witness_source
+                reader = Reader(data, pos)
+                for tx_in in tx_ins:
+                    tx_in.read_witness(reader)
+                self.witness_source = None
+            self._tx_ins = tx_ins
+            self.tx_ins_source = None
+        return self._tx_ins
+
+    @tx_ins.setter
+    def tx_ins(self, tx_ins: List['TxIn']) -> None:
+        self._tx_ins = TrackedList(tx_ins, self)
+        self.tx_ins_source = None
+        self.witness_source = None
+        self.changed()
+
+    @property
+    def tx_outs(self) -> List['TxOut']:
+        if self.tx_outs_source is not None:
+            self._tx_outs = self.load(TxOut, self.tx_outs_source)
+            self.tx_outs_source = None
+        return self._tx_outs
+
+    @tx_outs.setter
+    def tx_outs(self, tx_outs: List['TxOut']) -> None:
+        self._tx_outs = TrackedList(tx_outs, self)
+        self.tx_outs_source = None
+        self.changed()
+
+    def load(self, item_class: type, source: Tuple[bytes, int, int]) -> TrackedList:
+        '''Builds TxIn or TxOut list from the raw bytes(scripts are still not decoded)'''
+        data, count, pos = source
+        reader = Reader(data, pos)
+        items = [item_class.read(reader) for _ in range(count)]
+        # new items have no other owner, so they share one reference to this Tx
+        owner = weakref.ref(self)
+        for item in items:
+            item.__dict__['owners'] = owner
+        return TrackedList(items, self, tracked=True)
+
+    def raw_view(self) -> memoryview:
+        '''Returns the serialization(cached or parsed from, with witnesses) without copy'''
+        if self.raw is None:
+            self.build_raw()
+        data, start, end = self.raw
+        return memoryview(data)[start:end]
+
+    def build_raw(self) -> None:
+        tx_ins = self.tx_ins
+        segwit = any(tx_in.has_witness() for tx_in in tx_ins)
+        writer = Writer()
+        writer.write_uint32(self.version)
+        if segwit:
+            writer.write(SEGWIT_MARKER)
+        writer.write_varint(len(tx_ins))
+        for tx_in in tx_ins:
+            tx_in.write(writer)
+        writer.write_varint(len(self.tx_outs))
+        for tx_out in self.tx_outs:
+            tx_out.write(writer)
+        witness_pos = None
+        if segwit:
+            witness_pos = len(writer.buf)
+            for tx_in in tx_ins:
+                tx_in.write_witness(writer)
+        writer.write_uint32(self.locktime)
+        data = writer.getvalue()
+        self.raw = (data, 0, len(data))
+        self.witness_pos = witness_pos
+
+    def legacy_views(self) -> List[memoryview]:
+        '''Returns the parts of serialization without segwit marker and witnesses'''
+        view = self.raw_view()
+        if self.witness_pos is None:
+            return [view]
+        data, start, end = self.raw
+        view = memoryview(data)
+        return [view[start:start + 4], view[start + 6:self.witness_pos], view[end - 4:end]]
+
     def id(self) -> str:
         '''Human-readable hexadecimal of the transaction hash'''
         return self.hash().hex()
 
     def hash(self) -> bytes:
         '''Binary hash of the legacy serialization(32bytes)'''
-        return hash256(self.serialize())[::-1]  # reverse endian
+        if self.hash_cache is None:
+            views = self.legacy_views()
+            raw = views[0] if len(views) == 1 else b''.join(views)
+            self.hash_cache = hash256(raw)[::-1]  # reverse endian
+        return self.hash_cache
+
+    def wtxid(self) -> str:
+        '''Human-readable hexadecimal of the witness hash'''
+        return self.witness_hash().hex()
+
+    def witness_hash(self) -> bytes:
+        '''Binary hash of the serialization with witnesses(same as hash() for non segwit Tx)'''
+        if self.witness_hash_cache is None:
+            view = self.raw_view()
+            if self.witness_pos is None:
+                self.witness_hash_cache = self.hash()
+            else:
+                self.witness_hash_cache = hash256(view)[::-1]
+        return self.witness_hash_cache
+
+    def is_segwit(self) -> bool:
+        self.raw_view()
+        return self.witness_pos is not None
+
+    def size(self) -> int:
+        '''Size of the serialization with witnesses'''
+        return len(self.raw_view())
+
+    def weight(self) -> int:
+        '''Legacy bytes count 4 weight units, segwit marker and witnesses count 1(BIP141)'''
+        size = self.size()
+        legacy_size = sum(len(view) for view in self.legacy_views())
+        return legacy_size * 3 + size
+
+    def vsize(self) -> int:
+        '''Virtual size(weight / 4, rounded up)'''
+        return (self.weight() + 3) // 4
 
     @classmethod
     def parse(cls, s: StreamReader, testnet=False) -> 'Tx':
@@ -132,40 +559,77 @@ class Tx:
         Takes a byte stream and parses the transaction at the start
         return a Tx object
         '''
-        version = little_endian_to_int(s.read(4))
-        tx_in_len = read_varint(s)
-        if tx_in_len == 0:
-            raise ValueError('Tx need at least one input')
-        tx_ins = []
+        with Reader.of(s) as reader:
+            return cls.read(reader, testnet)
+
+    @classmethod
+    def read(cls, reader: Reader, testnet=False) -> 'Tx':
+        '''
+        Only records where inputs and outputs are,
+        they are built when tx_ins or tx_outs is accessed.
+        '''
+        start = reader.pos
+        version = reader.read_uint32()
+        tx_in_len = reader.read_varint()
+        segwit = tx_in_len == 0
+        if segwit:
+            # marker(0x00) is followed by flag(0x01)
+            if reader.read_uint8() != 1:
+                raise ValueError('Tx need at least one input')
+            tx_in_len = reader.read_varint()
+            if tx_in_len == 0:
+                raise ValueError('Tx need at least one input')
+        tx_ins_pos = reader.pos
         for _ in range(tx_in_len):
-            tx_ins.append(TxIn.parse(s))
-        tx_out_len = read_varint(s)
+            # prev_tx, prev_index
+            reader.skip(36)
+            # script_sig, sequence
+            reader.skip(reader.read_varint() + 4)
+        tx_out_len = reader.read_varint()
         if tx_out_len == 0:
             raise ValueError('Tx need at least one output')
-        tx_outs = []
+        tx_outs_pos = reader.pos
         for _ in range(tx_out_len):
-            tx_outs.append(TxOut.parse(s))
-        locktime = little_endian_to_int(s.read(4))
-        return cls(version=version, tx_ins=tx_ins, tx_outs=tx_outs, locktime=locktime)
+            # amount
+            reader.skip(8)
+            # script_pubkey
+            reader.skip(reader.read_varint())
+        witness_pos = reader.pos
+        if segwit:
+            for _ in range(tx_in_len):
+                for _ in range(reader.read_varint()):
+                    reader.skip(reader.read_varint())
+        locktime = reader.read_uint32()
+        tx = cls(version=version, tx_ins=None, tx_outs=None, locktime=locktime)
+        data = reader.data
+        end = reader.pos
+        if reader.private_data:
+            # buffer of stream is not shared with the caller, keep only this tx alive
+            data = bytes(data[start:end])
+            tx_ins_pos -= start
+            tx_outs_pos -= start
+            witness_pos -= start
+            end -= start
+            start = 0
+        tx.raw = (data, start, end)
+        tx.tx_ins_source = (data, tx_in_len, tx_ins_pos)
+        tx.tx_outs_source = (data, tx_out_len, tx_outs_pos)
+        if segwit:
+            tx.witness_pos = witness_pos
+            tx.witness_source = (data, witness_pos)
+        return tx
 
     def serialize(self) -> bytes:
         '''Returns the byte serialization of the transaction'''
-        result = int_to_little_endian(self.version, 4)
-        result += encode_varint(len(self.tx_ins))
-        for tx_in in self.tx_ins:
-            result += tx_in.serialize()
-        result += encode_varint(len(self.tx_outs))
-        for tx_out in self.tx_outs:
-            result += tx_out.serialize()
-        result += int_to_little_endian(self.locktime, 4)
-        return result
+        return self.raw_view().tobytes()
+
+    def write(self, writer: Writer) -> None:
+        writer.write(self.raw_view())
 
     def fee(self) -> int:
         '''Returns the fee of this transaction in satoshi'''
         # get all inputs tx
-        in_amount = 0
-        for tx_in in self.tx_ins:
-            in_amount += tx_in.value()
+        in_amount = self.prevouts().total()
         out_amount = 0
         for tx_out in self.tx_outs:
             out_amount += tx_out.amount
@@ -174,96 +638,144 @@ class Tx:
                 "Input amount is lower than Output amount, It'll make a new bitcoin.")
         return in_amount - out_amount
 
-    def sig_hash(self, input_index: int, redeem_script=None) -> int:
+    def prevouts(self) -> PrevoutView:
+        '''Previous outputs of all inputs, resolved once until this Tx(or its prevout_source, testnet) is changed'''
+        view = self.prevout_view_cache
+        if view is None or view.source is not self.prevout_source or view.testnet != self.testnet:
+            view = self.prevout_view_cache = PrevoutView(self)
+        return view
+
+    def sig_hasher(self) -> SigHasher:
+        '''SigHasher shared by all inputs, it is built again only after this Tx is changed'''
+        if self.sig_hasher_cache is None:
+            self.sig_hasher_cache = SigHasher(self)
+        return self.sig_hasher_cache
+
+    def sig_hash(self, input_index: int, redeem_script: Script = None, hash_type: int = SIGHASH_ALL) -> int:
         '''
         Returns the integer representation of the hash that needs to get
         signed for index input_index
         '''
-        # start the serialization with version
-        # use int_to_little_endian in 4 bytes
-        result = int_to_little_endian(self.version, 4)
-
-        # add how many inputs there are using encode_varint
-        result += encode_varint(len(self.tx_ins))
-
-        # loop through each input using enumerate, so we have the input index
-        # if the input index is the one we're signing
-        # the previous tx's ScriptPubkey is the ScriptSig or Redeem_script
-        # Otherwise, the ScriptSig is empty
-        # add the serialization of the input with the ScriptSig we want
-        for idx, tx_in in enumerate(self.tx_ins):
-            if idx == input_index:
-                if redeem_script:
-                    script_sig = redeem_script
-                else:
-                    script_sig = tx_in.script_pubkey(self.testnet)
+        # the previous tx's ScriptPubkey(or Redeem_script) is signed in place of ScriptSig
+        if redeem_script:
+            script_code = redeem_script
+        else:
+            script_code = self.prevouts().script_pubkey(input_index)
+        return self.sig_hasher().sig_hash(input_index, script_code, hash_type)
+
+    def sig_hash_bip143(
+        self, input_index: int, redeem_script: Script = None,
+        witness_script: Script = None, hash_type: int = SIGHASH_ALL
+    ) -> int:
+        '''
+        Returns the integer representation of the segwit(BIP143) hash that needs to get
+        signed for index input_index
+        redeem_script: p2wpkh RedeemScript of p2sh-p2wpkh
+        '''
+        prevouts = self.prevouts()
+        if witness_script:
+            script_code = witness_script
+        else:
+            if redeem_script:
+                key_hash = redeem_script.decode()[1]
             else:
-                script_sig = None
-            result += TxIn(
-                prev_tx=tx_in.prev_tx,
-                prev_index=tx_in.prev_index,
-                script_sig=script_sig,
-                sequence=tx_in.sequence,
-            ).serialize()
-        # add how many outputs there are using encode_varint
-        result += encode_varint(len(self.tx_outs))
-        # add the serialization of each output
-        for tx_out in self.tx_outs:
-            result += tx_out.serialize()
-        # add the locktime using int_to_little_endian in 4 bytes
-        result += int_to_little_endian(self.locktime, 4)
-        # add SIGHASH_ALL using int_to_little_endian in 4 bytes
-        result += int_to_little_endian(SIGHASH_ALL, 4)
-        # hash256 the serialization
-        z = hash256(result)
-        # convert the result to an integer using int.from_bytes(x, 'big')
-        return int.from_bytes(z, 'big')
+                key_hash = prevouts.script_pubkey(input_index).decode()[1]
+            script_code = p2pkh_script(key_hash)
+        amount = prevouts.amount(input_index)
+        return self.sig_hasher().segwit_sig_hash(input_index, script_code, amount, hash_type)
 
-    def verify_input(self, input_index: int) -> bool:
-        '''Returns whether the input has a valid signature'''
+    def verify_input_job(self, input_index: int) -> Tuple[Script, Script, 'InputSigHash']:
+        '''
+        Returns (script_sig, script_pubkey, z) which is needed for verifying the input
+        z is computed for the hash type of each signature when scripts are evaluated.
+        For p2wpkh, witness is used as script_sig and p2pkh script of the key hash as script_pubkey.
+        '''
         # get the relevant input
         tx_in = self.tx_ins[input_index]
-        # grab the previous ScriptPubKey
-        script_pubkey = tx_in.script_pubkey(self.testnet)
+        # grab the previous ScriptPubKey, unknown(or spent) output can not be spent
+        try:
+            script_pubkey = self.prevouts().script_pubkey(input_index)
+        except ValueError:
+            return None
+        redeem_script = None
         if script_pubkey.is_p2sh_script_pubkey():
-            cmd = tx_in.script_sig.cmds[-1]
-            raw_redeem = encode_varint(len(cmd)) + cmd
-            redeem_script = Script.parse(BytesIO(raw_redeem))
-        else:
-            redeem_script = None
-        # get the signature hash (z)
-        z = self.sig_hash(input_index, redeem_script)
-        # combine the current ScriptSig and the previous ScriptPubKey
-        script = tx_in.script_sig + script_pubkey
-        # evaluate the combined script
-        return script.evaluate(z)
-
-    def verify(self) -> bool:
-        '''Verify this transaction'''
-        # 1. check unspent (query UTXO)
+            redeem_script = Script.parse_raw(tx_in.script_sig.decode()[-1])
+            if redeem_script.is_witness_program():
+                # p2sh-p2wpkh: script_sig has only the RedeemScript
+                if len(tx_in.script_sig.decode()) != 1 \
+                        or hash160(redeem_script.raw_serialize()) != script_pubkey.decode()[1]:
+                    return None
+                script_pubkey = redeem_script
+        if script_pubkey.is_witness_program() and not script_pubkey.is_p2wpkh_script_pubkey():
+            # p2wsh, taproot and future versions(also nested in p2sh) are not evaluated, so they can not pass
+            return None
+        if script_pubkey.is_p2wpkh_script_pubkey():
+            if script_pubkey is not redeem_script and tx_in.script_sig.decode():
+                return None
+            script_code = p2pkh_script(script_pubkey.decode()[1])
+            amount = self.prevouts().amount(input_index)
+            z = self.sig_hasher().input_sig_hash(input_index, script_code, amount)
+            return Script(tx_in.witness), script_code, z
+        # the previous tx's ScriptPubkey(or Redeem_script) is signed in place of ScriptSig
+        z = self.sig_hasher().input_sig_hash(input_index, redeem_script or script_pubkey)
+        return tx_in.script_sig, script_pubkey, z
+
+    def verify_input(self, input_index: int) -> bool:
+        '''Returns whether the input has a valid signature'''
+        return verify_script(self.verify_input_job(input_index))
 
+    def verify(self, executor: Executor = None) -> bool:
+        '''
+        Verify this transaction
+        executor: if it is given(ex. ProcessPoolExecutor), inputs are verified in parallel.
+        '''
+        # 1. check unspent (query UTXO)
+        # every previous output is resolved once(in one batch) for this verification
+        try:
+            self.prevout_view_cache = PrevoutView(self)
+        except ValueError:
+            return False
         # 2. check fee
         if self.fee() < 0:
             return False
         # 3. check validation of input.
+        if executor is not None:
+            # resolve all previous outputs here, workers only evaluate scripts.
+            jobs = [self.verify_input_job(idx) for idx in range(len(self.tx_ins))]
+            return all(executor.map(verify_script, jobs))
         for idx in range(len(self.tx_ins)):
             if not self.verify_input(idx):
                 return False
         return True
 
-    def sign_input(self, input_index: int, private_key: PrivateKey) -> Signature:
+    def sign_input(self, input_index: int, private_key: PrivateKey, hash_type: int = SIGHASH_ALL) -> Signature:
+        '''Signs p2pkh or p2wpkh input'''
+        tx_in = self.tx_ins[input_index]
+        segwit = self.prevouts().script_pubkey(input_index).is_p2wpkh_script_pubkey()
         # get the signature hash (z)
-        z = self.sig_hash(input_index)
+        if segwit:
+            z = self.sig_hash_bip143(input_index, hash_type=hash_type)
+        else:
+            z = self.sig_hash(input_index, hash_type=hash_type)
         # get der signature of z from private key
         der = private_key.sign(z).serialize_der()
-        # append the SIGHASH_ALL to der (use SIGHASH_ALL.to_bytes(1, 'big'))
-        sig = der + SIGHASH_ALL.to_bytes(1, 'big')
+        # append the hash type to der
+        sig = der + hash_type.to_bytes(1, 'big')
         # calculate the sec
         sec = private_key.point.serialize_sec()
-        # initialize a new script with [sig, sec] as the cmds
-        script = Script([sig, sec])
-        # change input's script_sig to new script
-        self.tx_ins[input_index].script_sig = script
+        hasher = self.sig_hasher()
+        prevouts = self.prevouts()
+        if segwit:
+            # p2wpkh has [sig, sec] in witness, script_sig is empty
+            tx_in.witness = [sig, sec]
+        else:
+            # initialize a new script with [sig, sec] as the cmds
+            # change input's script_sig to new script
+            tx_in.script_sig = Script([sig, sec])
+        # script_sig and witness are not a part of the signature hash,
+        # so the hasher and previous outputs are still valid for other inputs
+        self.sig_hasher_cache = hasher
+        self.prevout_view_cache = prevouts
         # return whether sig is valid using self.verify_input
         return self.verify_input(input_index)
 
@@ -283,7 +795,7 @@ class Tx:
         '''
         if not self.is_coinbase():
             return None
-        return little_endian_to_int(self.tx_ins[0].script_sig.cmds[0])
+        return little_endian_to_int(self.tx_ins[0].script_sig.decode()[0])
 
 
 class TxFetcher:
@@ -310,12 +822,7 @@ class TxFetcher:
             except ValueError:
                 raise ValueError(
                     'unexpected response: {}'.format(response.text))
-            if raw[4] == 0:
-                raw = raw[:4] + raw[6:]
-                tx = Tx.parse(BytesIO(raw), testnet=testnet)
-                tx.locktime = little_endian_to_int(raw[-4:])
-            else:
-                tx = Tx.parse(BytesIO(raw), testnet=testnet)
+            tx = Tx.parse(raw, testnet=testnet)
             if tx.id() != tx_id:
                 raise ValueError(
                     'not the same id: {}(response) vs {}(request)'.format(tx.id(), tx_id))
@@ -324,19 +831,25 @@ class TxFetcher:
         cls.cache[tx_id].testnet = testnet
         return cls.cache[tx_id]
 
+    @classmethod
+    def prevout(cls, txid: bytes, index: int, testnet=False) -> 'TxOut':
+        '''Returns the output of fetched tx(prevout source interface)'''
+        tx_outs = cls.fetch(txid.hex(), testnet=testnet).tx_outs
+        if index >= len(tx_outs):
+            raise ValueError('unknown outpoint {}:{}'.format(txid.hex(), index))
+        return tx_outs[index]
+
+    @classmethod
+    def prevouts(cls, outpoints: List[Tuple[bytes, int]], testnet=False) -> Dict[Tuple[bytes, int], 'TxOut']:
+        '''Returns the outputs of fetched txs, each tx is fetched once(prevout source interface)'''
+        return {(txid, index): cls.prevout(txid, index, testnet) for txid, index in outpoints}
+
     @classmethod
     def load_cache(cls, filename: str) -> None:
         data = open(filename, 'r').read()
         disk_cache = json.loads(data)
         for k, raw_hex in disk_cache.items():
-            raw = bytes.fromhex(raw_hex)
-            if raw[4] == 0:
-                raw = raw[:4] + raw[6:]
-                tx = Tx.parse(BytesIO(raw))
-                tx.locktime = little_endian_to_int(raw[-4:])
-            else:
-                tx = Tx.parse(BytesIO(raw))
-            cls.cache[k] = tx
+            cls.cache[k] = Tx.parse(bytes.fromhex(raw_hex))
 
     @classmethod
     def dump_cacahe(cls, filename: str) -> None:
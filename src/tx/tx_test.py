@@ -1,9 +1,12 @@
+from concurrent.futures import ProcessPoolExecutor
 from unittest import TestCase
 from io import BytesIO
+import pickle
+from tempfile import TemporaryFile
 
-from src.helper.helper import decode_base58
-from src.script.script import p2pkh_script
-from src.tx.tx import (TxFetcher, Tx, TxIn, TxOut)
+from src.helper.helper import SIGHASH_ALL, SIGHASH_ANYONECANPAY, SIGHASH_NONE, SIGHASH_SINGLE, decode_base58, hash160, hash256
+from src.script.script import Script, p2pkh_script, p2wpkh_script
+from src.tx.tx import (SigHasher, TxFetcher, Tx, TxIn, TxOut)
 from src.ecdsa.s256Ecc import (PrivateKey)
 
 
@@ -62,6 +65,169 @@ class TxTest(TestCase):
         tx = Tx.parse(stream)
         self.assertEqual(tx.serialize(), raw_tx)
 
+    def test_parse_lazy(self):
+        raw_tx = bytes.fromhex('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
+        want = hash256(raw_tx)[::-1]
+        # trailing data is not part of the tx
+        stream = BytesIO(raw_tx + b'\xff')
+        tx = Tx.parse(stream)
+        self.assertEqual(stream.read(), b'\xff')
+        self.assertEqual(tx.hash(), want)
+        self.assertEqual(bytes(tx.raw_view()), raw_tx)
+        script_pubkey = tx.tx_outs[1].script_pubkey
+        self.assertIsNotNone(script_pubkey.raw)
+        self.assertEqual(script_pubkey.decode()[2].hex(), '1c4bc762dd5423e332166702cb75f40df79fea12')
+        # reading inputs and outputs keeps the raw bytes
+        self.assertEqual(tx.tx_ins[0].prev_index, 0)
+        self.assertEqual(bytes(tx.raw_view()), raw_tx)
+        self.assertIs(tx.hash(), tx.hash())
+        with self.assertRaises(SyntaxError):
+            Tx.parse(BytesIO(raw_tx[:-1]))
+        # file of several txs is read one by one
+        with TemporaryFile() as f:
+            f.write(raw_tx * 2)
+            f.seek(0)
+            self.assertEqual(Tx.parse(f).hash(), want)
+            self.assertEqual(f.tell(), len(raw_tx))
+            self.assertEqual(Tx.parse(f).hash(), want)
+            # each tx from a stream keeps only its own bytes
+            f.seek(0)
+            Tx.parse(f)
+            tx = Tx.parse(f)
+            self.assertEqual(tx.raw, (raw_tx, 0, len(raw_tx)))
+            self.assertEqual(tx.tx_ins[0].prev_index, 0)
+        stream = BytesIO(raw_tx * 2)
+        stream.seek(len(raw_tx))
+        tx = Tx.parse(stream)
+        self.assertEqual(tx.raw, (raw_tx, 0, len(raw_tx)))
+        self.assertEqual(tx.tx_outs[1].script_pubkey.serialize(), raw_tx[-30:-4])
+        # memoryview is parsed without copy
+        view = memoryview(raw_tx)
+        tx = Tx.parse(view)
+        self.assertIs(tx.raw[0], view)
+        self.assertEqual(tx.hash(), want)
+        self.assertEqual(tx.tx_outs[1].script_pubkey.serialize(), raw_tx[-30:-4])
+
+    def test_mutation(self):
+        raw_tx = bytes.fromhex('0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600')
+        tx = Tx.parse(BytesIO(raw_tx))
+        want = tx.hash()
+
+        def check_changed():
+            self.assertNotEqual(tx.hash(), want)
+            self.assertEqual(tx.hash(), hash256(tx.serialize())[::-1])
+            self.assertEqual(Tx.parse(BytesIO(tx.serialize())).hash(), tx.hash())
+
+        tx.tx_outs[1].amount -= 1
+        check_changed()
+        tx.tx_outs[1].amount += 1
+        self.assertEqual(tx.hash(), want)
+        tx.locktime += 1
+        check_changed()
+        tx.locktime -= 1
+        script_pubkey = tx.tx_outs[1].script_pubkey
+        script_pubkey.cmds[2] = bytes(20)
+        self.assertEqual(script_pubkey.serialize().hex(), '1976a914{}88ac'.format('00' * 20))
+        check_changed()
+        tx = Tx.parse(BytesIO(raw_tx))
+        tx.tx_ins[0].script_sig.cmds.pop()
+        check_changed()
+        tx = Tx.parse(BytesIO(raw_tx))
+        tx.tx_outs.append(TxOut(1, p2pkh_script(bytes(20))))
+        check_changed()
+        tx = Tx.parse(BytesIO(raw_tx))
+        tx.tx_ins[0].script_sig = p2pkh_script(bytes(20))
+        check_changed()
+        # lists given to constructors are copied
+        cmds = [0x76, 0xa9, bytes(20), 0x88, 0xac]
+        tx = Tx(1, [TxIn(bytes(32), 0)], [TxOut(1, Script(cmds))], 0)
+        want = tx.hash()
+        cmds[2] = b'\x01' * 20
+        self.assertEqual(tx.hash(), want)
+        self.assertEqual(tx.tx_outs[0].script_pubkey.cmds[2], bytes(20))
+
+    def test_parse_segwit(self):
+        tx_id = '78457666f82c28aa37b74b506745a7c7684dc7842a52a457b09f09446721e11c'
+        tx = TxFetcher.fetch(tx_id)
+        raw = tx.serialize()
+        self.assertEqual(raw[4:6], b'\x00\x01')
+        tx = Tx.parse(raw)
+        self.assertTrue(tx.is_segwit())
+        self.assertEqual(tx.id(), tx_id)
+        self.assertEqual(tx.wtxid(), hash256(raw)[::-1].hex())
+        self.assertEqual(len(tx.tx_ins[0].witness), 2)
+        self.assertEqual(tx.tx_ins[0].script_sig.serialize(), b'\x00')
+        self.assertEqual(tx.size(), 197)
+        self.assertEqual(tx.weight(), 452)
+        self.assertEqual(tx.vsize(), 113)
+        # witness of a tx in the middle of a stream
+        stream = BytesIO(b'\x00' + raw + b'\x00')
+        stream.seek(1)
+        parsed = Tx.parse(stream)
+        self.assertEqual(parsed.raw, (raw, 0, len(raw)))
+        self.assertEqual(parsed.wtxid(), tx.wtxid())
+        self.assertEqual(parsed.tx_ins[0].witness, tx.tx_ins[0].witness)
+        # building again from the fields gives the same serialization
+        tx.locktime = tx.locktime
+        self.assertIsNone(tx.raw)
+        self.assertEqual(tx.serialize(), raw)
+        self.assertEqual(tx.id(), tx_id)
+        # changing witness changes only wtxid
+        wtxid = tx.wtxid()
+        tx.tx_ins[0].witness[0] = bytes(72)
+        self.assertEqual(tx.id(), tx_id)
+        self.assertNotEqual(tx.wtxid(), wtxid)
+        # without witness, it is a legacy serialization
+        tx.tx_ins[0].witness = []
+        self.assertFalse(tx.is_segwit())
+        self.assertEqual(tx.id(), tx_id)
+        self.assertEqual(tx.wtxid(), tx_id)
+        self.assertEqual(tx.weight(), tx.size() * 4)
+
+    def test_sig_hash_bip143(self):
+        # native P2WPKH example of BIP143
+        raw_tx = bytes.fromhex('0100000002fff7f7881a8099afa6940d42d1e7f6362bec38171ea3edf433541db4e4ad969f0000000000eeffffffef51e1b804cc89d182d279655c3aa89e815b1b309fe287d9b2b55d57b90ec68a0100000000ffffffff02202cb206000000001976a9148280b37df378db99f66f85c95a783a76ac7a6d5988ac9093510d000000001976a9143bde42dbee7e4dbe6a21b2d50ce2f0167faa815988ac11000000')
+        tx = Tx.parse(raw_tx)
+        script_code = p2pkh_script(bytes.fromhex('1d0f172a0ecb48aee1be1f2687d2963ae33f71a1'))
+        want = int('c37af31116d1b27caf68aae9e3ac82f1477929014d5b917657d0eb49478cb670', 16)
+        self.assertEqual(tx.sig_hasher().segwit_sig_hash(1, script_code, 600000000), want)
+
+    def test_sign_p2wpkh(self):
+        private_key = PrivateKey(secret=8675309)
+        h160 = private_key.point.hash160()
+        prev = Tx(1, [TxIn(bytes(32), 0)], [TxOut(100000, p2wpkh_script(h160))], 0, testnet=True)
+        prev_id = prev.id()
+        TxFetcher.cache[prev_id] = prev
+        tx = Tx(1, [TxIn(prev.hash(), 0)], [TxOut(90000, p2pkh_script(h160))], 0, testnet=True)
+        self.assertTrue(tx.sign_input(0, private_key))
+        self.assertTrue(tx.is_segwit())
+        self.assertEqual(tx.tx_ins[0].script_sig.serialize(), b'\x00')
+        self.assertTrue(tx.verify())
+        tx = Tx.parse(tx.serialize(), testnet=True)
+        self.assertTrue(tx.verify())
+        # amount of the previous output is signed
+        prev.tx_outs[0].amount += 1
+        self.assertFalse(tx.verify_input(0))
+        del TxFetcher.cache[prev_id]
+
+    def test_verify_unknown_witness_program(self):
+        private_key = PrivateKey(secret=8675309)
+        h160 = private_key.point.hash160()
+        p2wsh = Script([0x00, bytes(32)])
+        p2tr = Script([0x51, bytes(32)])
+        nested = Script([0xa9, hash160(p2wsh.raw_serialize()), 0x87])
+        prev = Tx(1, [TxIn(bytes(32), 0)], [
+            TxOut(100000, p2wsh), TxOut(100000, p2tr), TxOut(100000, nested)], 0, testnet=True)
+        prev_id = prev.id()
+        TxFetcher.cache[prev_id] = prev
+        for index in range(3):
+            tx = Tx(1, [TxIn(prev.hash(), index)], [TxOut(90000, p2pkh_script(h160))], 0, testnet=True)
+            if index == 2:
+                tx.tx_ins[0].script_sig = Script([p2wsh.raw_serialize()])
+            self.assertFalse(tx.verify_input(0))
+            self.assertFalse(tx.verify())
+        del TxFetcher.cache[prev_id]
+
     def test_input_value(self):
         tx_hash = 'd1c789a9c60383bf715f3f6ad9d14b91fe55f3deb369fe5d9280cb1a01793f81'
         index = 0
@@ -94,6 +260,67 @@ class TxTest(TestCase):
             '27e0c5994dec7824e56dec6b2fcb342eb7cdb0d0957c2fce9882f715e85d81a6', 16)
         self.assertEqual(tx.sig_hash(0), want)
 
+    def test_sig_hash_types(self):
+        def naive_sig_hash(tx, input_index, script_code, hash_type):
+            # builds the modified copy of tx like the reference implementation
+            base_type = hash_type & 0x1f
+            if base_type == SIGHASH_SINGLE and input_index >= len(tx.tx_outs):
+                return 1
+            tx_ins = []
+            for idx, tx_in in enumerate(tx.tx_ins):
+                if idx == input_index:
+                    tx_ins.append(TxIn(tx_in.prev_tx, tx_in.prev_index, script_code, tx_in.sequence))
+                elif not hash_type & SIGHASH_ANYONECANPAY:
+                    sequence = 0 if base_type in (SIGHASH_NONE, SIGHASH_SINGLE) else tx_in.sequence
+                    tx_ins.append(TxIn(tx_in.prev_tx, tx_in.prev_index, None, sequence))
+            if base_type == SIGHASH_NONE:
+                tx_outs = []
+            elif base_type == SIGHASH_SINGLE:
+                tx_outs = [TxOut(0xffffffffffffffff, Script()) for _ in range(input_index)]
+                tx_outs.append(tx.tx_outs[input_index])
+            else:
+                tx_outs = tx.tx_outs
+            modified = Tx(tx.version, tx_ins, tx_outs, tx.locktime)
+            raw = modified.serialize() + hash_type.to_bytes(4, 'little')
+            return int.from_bytes(hash256(raw), 'big')
+
+        script_code = p2pkh_script(bytes(20))
+        hash_types = [SIGHASH_ALL, SIGHASH_NONE, SIGHASH_SINGLE]
+        hash_types += [t | SIGHASH_ANYONECANPAY for t in hash_types]
+        for tx_id in ('75d7454b7010fa28b00f16cccb640b1756fd6e357c03a3b81b9d119505f47b56',
+                      '22874d30bde689475e1df03608aa85a3c7b01e18f8d53aedc1b6df6ded788286'):
+            tx = TxFetcher.fetch(tx_id)
+            hasher = SigHasher(tx)
+            for idx in (0, 1, 2, len(tx.tx_ins) - 1):
+                for hash_type in hash_types:
+                    want = naive_sig_hash(tx, idx, script_code, hash_type)
+                    self.assertEqual(hasher.sig_hash(idx, script_code, hash_type), want)
+        # SIGHASH_SINGLE without matching output
+        self.assertEqual(hasher.sig_hash(100, script_code, SIGHASH_SINGLE), 1)
+
+    def test_verify_mixed_hash_types(self):
+        class Source:
+            @classmethod
+            def prevouts(cls, outpoints, testnet=False):
+                return {outpoint: prevout for outpoint in outpoints}
+
+        keys = [PrivateKey(secret=secret) for secret in (8675309, 8675310)]
+        # bare 2 of 2 multisig
+        script_pubkey = Script([0x52] + [key.point.serialize_sec() for key in keys] + [0x52, 0xae])
+        prevout = TxOut(10000, script_pubkey)
+        tx = Tx(1, [TxIn(bytes(32), 0)], [TxOut(9000, p2pkh_script(bytes(20)))], 0)
+        tx.prevout_source = Source
+        signatures = [
+            keys[0].sign(tx.sig_hash(0, hash_type=SIGHASH_ALL)).serialize_der() + bytes([SIGHASH_ALL]),
+            keys[1].sign(tx.sig_hash(0, hash_type=SIGHASH_NONE)).serialize_der() + bytes([SIGHASH_NONE]),
+        ]
+        tx.tx_ins[0].script_sig = Script([0] + signatures)
+        self.assertTrue(tx.verify())
+        # hash type byte is signed, it can not be changed
+        signatures[1] = signatures[1][:-1] + bytes([SIGHASH_ALL])
+        tx.tx_ins[0].script_sig = Script([0] + signatures)
+        self.assertFalse(tx.verify_input(0))
+
     def test_verify_p2pkh(self):
         tx = TxFetcher.fetch(
             '452c629d67e41baec3ac6f04fe744b4b9617f8f859c63b3002f8684e7a4fee03')
@@ -107,6 +334,65 @@ class TxTest(TestCase):
             '46df1a9484d0a81d03ce0ee543ab6e1a23ed06175c104a178268fad381216c2b')
         self.assertTrue(tx.verify())
 
+    def test_prevout_view(self):
+        class CountingSource:
+            calls = []
+
+            @classmethod
+            def prevout(cls, txid, index, testnet=False):
+                cls.calls.append('prevout')
+                return TxFetcher.prevout(txid, index, testnet)
+
+            @classmethod
+            def prevouts(cls, outpoints, testnet=False):
+                cls.calls.append('prevouts')
+                return TxFetcher.prevouts(outpoints, testnet)
+
+        tx = Tx.parse(TxFetcher.fetch(
+            '46df1a9484d0a81d03ce0ee543ab6e1a23ed06175c104a178268fad381216c2b').serialize())
+        tx.prevout_source = CountingSource
+        self.assertTrue(tx.verify())
+        self.assertEqual(CountingSource.calls, ['prevouts'])
+        self.assertEqual(len(tx.prevouts()), 1)
+        self.assertEqual(tx.prevouts().total() - tx.fee(), sum(tx_out.amount for tx_out in tx.tx_outs))
+        tx.sig_hash(0, Script.parse_raw(tx.tx_ins[0].script_sig.decode()[-1]))
+        self.assertEqual(CountingSource.calls, ['prevouts'])
+        # next verification resolves again
+        self.assertTrue(tx.verify())
+        self.assertEqual(CountingSource.calls, ['prevouts', 'prevouts'])
+        # output which the previous tx does not have can not be verified
+        tx.tx_ins[0].prev_index = 100
+        self.assertFalse(tx.verify())
+        self.assertFalse(tx.verify_input(0))
+
+    def test_verify_parallel(self):
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            tx = TxFetcher.fetch(
+                '452c629d67e41baec3ac6f04fe744b4b9617f8f859c63b3002f8684e7a4fee03')
+            self.assertTrue(tx.verify(executor))
+            tampered = Tx.parse(BytesIO(tx.serialize()))
+            tampered.tx_outs[0].amount -= 1
+            self.assertFalse(tampered.verify(executor))
+            tx = TxFetcher.fetch(
+                '46df1a9484d0a81d03ce0ee543ab6e1a23ed06175c104a178268fad381216c2b')
+            self.assertTrue(tx.verify(executor))
+
+    def test_pickle(self):
+        tx = Tx.parse(TxFetcher.fetch(
+            '452c629d67e41baec3ac6f04fe744b4b9617f8f859c63b3002f8684e7a4fee03').serialize())
+        self.assertEqual(len(tx.tx_ins[0].script_sig.cmds), 2)
+        copied = pickle.loads(pickle.dumps(tx))
+        self.assertEqual(copied.serialize(), tx.serialize())
+        self.assertEqual(copied.tx_ins[0].script_sig.cmds, tx.tx_ins[0].script_sig.cmds)
+        # changes of the copy are still tracked
+        want = copied.hash()
+        copied.tx_ins[0].script_sig.cmds.pop()
+        self.assertNotEqual(copied.hash(), want)
+        self.assertEqual(copied.hash(), hash256(copied.serialize())[::-1])
+        self.assertEqual(tx.hash(), want)
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self.assertTrue(tx.verify(executor))
+
     def test_sign_input(self):
         private_key = PrivateKey(secret=8675309)
         stream = BytesIO(bytes.fromhex('010000000199a24308080ab26e6fb65c4eccfadf76749bb5bfa8cb08f291320b3c21e56f0d0d00000000ffffffff02408af701000000001976a914d52ad7ca9b3d096a38e752c2018e6fbc40cdf26f88ac80969800000000001976a914507b27411ccf7f16f10297de6cef3f291623eddf88ac00000000'))
@@ -114,6 +400,15 @@ class TxTest(TestCase):
         self.assertTrue(tx_obj.sign_input(0, private_key))
         want = '010000000199a24308080ab26e6fb65c4eccfadf76749bb5bfa8cb08f291320b3c21e56f0d0d0000006b4830450221008ed46aa2cf12d6d81065bfabe903670165b538f65ee9a3385e6327d80c66d3b502203124f804410527497329ec4715e18558082d489b218677bd029e7fa306a72236012103935581e52c354cd2f484fe8ed83af7a3097005b2f9c60bff71d35bd795f54b67ffffffff02408af701000000001976a914d52ad7ca9b3d096a38e752c2018e6fbc40cdf26f88ac80969800000000001976a914507b27411ccf7f16f10297de6cef3f291623eddf88ac00000000'
         self.assertEqual(tx_obj.serialize().hex(), want)
+        # SIGHASH_SINGLE | SIGHASH_ANYONECANPAY only commits to the input and the output of the same index
+        stream.seek(0)
+        tx_obj = Tx.parse(stream, testnet=True)
+        self.assertTrue(tx_obj.sign_input(0, private_key, SIGHASH_SINGLE | SIGHASH_ANYONECANPAY))
+        self.assertEqual(tx_obj.tx_ins[0].script_sig.cmds[0][-1], SIGHASH_SINGLE | SIGHASH_ANYONECANPAY)
+        tx_obj.tx_outs[1].amount -= 1
+        self.assertTrue(tx_obj.verify_input(0))
+        tx_obj.tx_outs[0].amount -= 1
+        self.assertFalse(tx_obj.verify_input(0))
 
     def test_is_coinbase(self):
         raw_tx = bytes.fromhex('01000000010000000000000000000000000000000000000000000000000000000000000000ffffffff5e03d71b07254d696e656420627920416e74506f6f6c20626a31312f4542312f4144362f43205914293101fabe6d6d678e2c8c34afc36896e7d9402824ed38e856676ee94bfdb0c6c4bcd8b2e5666a0400000000000000c7270000a5e00e00ffffffff01faf20b58000000001976a914338c84849423992471bffb1a54a8d9b1d69dc28a88ac00000000')
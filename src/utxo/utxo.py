@@ -0,0 +1,200 @@
+import sqlite3
+from typing import Dict, Iterable, List, Tuple
+
+from src.script.script import Script
+from src.tx.tx import Tx
+
+# (previous tx hash, output index)
+Outpoint = Tuple[bytes, int]
+
+# sqlite allows 999 host parameters on old versions
+QUERY_CHUNK = 500
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS utxo (
+    txid BLOB NOT NULL,
+    idx INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    script_pubkey BLOB NOT NULL,
+    height INTEGER NOT NULL,
+    coinbase INTEGER NOT NULL,
+    PRIMARY KEY (txid, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS undo (
+    height INTEGER NOT NULL,
+    txid BLOB NOT NULL,
+    idx INTEGER NOT NULL,
+    amount INTEGER,
+    script_pubkey BLOB,
+    coin_height INTEGER,
+    coinbase INTEGER
+);
+CREATE INDEX IF NOT EXISTS undo_height ON undo (height);
+CREATE TABLE IF NOT EXISTS tip (
+    height INTEGER NOT NULL
+);
+'''
+
+
+class UtxoEntry:
+    '''
+    Unspent output. It has amount and script_pubkey like TxOut,
+    so it can be used in place of the previous TxOut.
+    '''
+    __slots__ = ('amount', 'script_pubkey', 'height', 'is_coinbase')
+
+    def __init__(self, amount: int, script_pubkey: Script, height: int, is_coinbase: bool):
+        self.amount = amount
+        self.script_pubkey = script_pubkey
+        self.height = height
+        self.is_coinbase = is_coinbase
+
+    def __repr__(self) -> str:
+        return '{}:{}(height: {})'.format(self.amount, self.script_pubkey, self.height)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> 'UtxoEntry':
+        '''row: (amount, script_pubkey, height, coinbase)'''
+        amount, script_pubkey, height, coinbase = row
+        return cls(amount, Script.parse_raw(script_pubkey), height, bool(coinbase))
+
+
+class UtxoStore:
+    '''
+    UTXO set in sqlite, keyed by outpoint (txid, index).
+    apply_block and undo_block change the set atomically(one sqlite transaction per block),
+    blocks are applied one after another from the tip and undone from the tip.
+    It is a prevout source(prevout, prevouts) for Tx like TxFetcher.
+    '''
+
+    def __init__(self, path: str = ':memory:'):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> 'UtxoStore':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.db.execute('SELECT COUNT(*) FROM utxo').fetchone()[0]
+
+    def __contains__(self, outpoint: Outpoint) -> bool:
+        return bool(self.get_many([outpoint]))
+
+    def get(self, txid: bytes, index: int) -> UtxoEntry:
+        '''Returns the unspent output(None if it is spent or unknown)'''
+        return self.get_many([(txid, index)]).get((txid, index))
+
+    def get_many(self, outpoints: Iterable[Outpoint]) -> Dict[Outpoint, UtxoEntry]:
+        '''
+        Looks up many outpoints with a few queries.
+        Returns {outpoint: UtxoEntry}, spent or unknown outpoints are not in it.
+        '''
+        return {k: UtxoEntry.from_row(row) for k, row in self.get_rows(outpoints).items()}
+
+    def get_rows(self, outpoints: Iterable[Outpoint]) -> Dict[Outpoint, tuple]:
+        wanted = set(outpoints)
+        txids = list({txid for txid, _ in wanted})
+        rows = {}
+        for i in range(0, len(txids), QUERY_CHUNK):
+            chunk = txids[i:i + QUERY_CHUNK]
+            query = 'SELECT txid, idx, amount, script_pubkey, height, coinbase FROM utxo WHERE txid IN ({})'.format(
+                ','.join('?' * len(chunk)))
+            for txid, idx, *row in self.db.execute(query, chunk):
+                if (txid, idx) in wanted:
+                    rows[(txid, idx)] = tuple(row)
+        return rows
+
+    def tip(self) -> int:
+        '''Returns the height of the last applied block(None if no block is applied)'''
+        row = self.db.execute('SELECT height FROM tip').fetchone()
+        return None if row is None else row[0]
+
+    def set_tip(self, height: int) -> None:
+        self.db.execute('DELETE FROM tip')
+        self.db.execute('INSERT INTO tip VALUES (?)', (height,))
+
+    def prevout(self, txid: bytes, index: int, testnet=False) -> UtxoEntry:
+        '''Returns the previous output of an input(prevout source interface)'''
+        entry = self.get(txid, index)
+        if entry is None:
+            raise ValueError('unknown outpoint {}:{}'.format(txid.hex(), index))
+        return entry
+
+    def prevouts(self, outpoints: Iterable[Outpoint], testnet=False) -> Dict[Outpoint, UtxoEntry]:
+        '''Returns the previous outputs of many inputs in one batch(prevout source interface)'''
+        outpoints = list(outpoints)
+        entries = self.get_many(outpoints)
+        for txid, index in outpoints:
+            if (txid, index) not in entries:
+                raise ValueError('unknown outpoint {}:{}'.format(txid.hex(), index))
+        return entries
+
+    def apply_block(self, txs: List[Tx], height: int) -> None:
+        '''
+        Spends the inputs and adds the outputs of txs(in block order).
+        Spent outputs are kept for undo_block. If an input is unknown or an output already exists,
+        nothing is changed. height must be the next of the tip(any height for the first block).
+        '''
+        tip = self.tip()
+        if tip is not None and height != tip + 1:
+            raise ValueError('block of height {} can not be applied on the tip {}'.format(height, tip))
+        with self.db:
+            for tx in txs:
+                coinbase = tx.is_coinbase()
+                if not coinbase:
+                    self.spend(tx, height)
+                tx_hash = tx.hash()
+                rows = [
+                    (tx_hash, idx, tx_out.amount, tx_out.script_pubkey.raw_serialize(), height, coinbase)
+                    for idx, tx_out in enumerate(tx.tx_outs)
+                ]
+                try:
+                    self.db.executemany('INSERT INTO utxo VALUES (?, ?, ?, ?, ?, ?)', rows)
+                except sqlite3.IntegrityError:
+                    raise ValueError('outputs of tx {} already exist'.format(tx.id())) from None
+                # created outputs have no amount in undo
+                self.db.executemany(
+                    'INSERT INTO undo (height, txid, idx) VALUES (?, ?, ?)',
+                    [(height, tx_hash, idx) for idx in range(len(rows))])
+            self.set_tip(height)
+
+    def spend(self, tx: Tx, height: int) -> None:
+        outpoints = [(tx_in.prev_tx, tx_in.prev_index) for tx_in in tx.tx_ins]
+        rows = self.get_rows(outpoints)
+        for txid, index in outpoints:
+            if (txid, index) not in rows:
+                raise ValueError('unknown outpoint {}:{} in tx {}'.format(txid.hex(), index, tx.id()))
+        if len(rows) != len(outpoints):
+            raise ValueError('tx {} spends the same output twice'.format(tx.id()))
+        self.db.executemany('DELETE FROM utxo WHERE txid = ? AND idx = ?', outpoints)
+        self.db.executemany(
+            'INSERT INTO undo VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(height, txid, idx) + row for (txid, idx), row in rows.items()])
+
+    def undo_block(self, height: int) -> None:
+        '''
+        Reverts apply_block of height: spent outputs come back and created outputs are removed.
+        Only the tip can be undone, then the previous block is the tip.
+        '''
+        tip = self.tip()
+        if height != tip:
+            raise ValueError('block of height {} is not the tip {}'.format(height, tip))
+        with self.db:
+            spent = self.db.execute(
+                'SELECT txid, idx, amount, script_pubkey, coin_height, coinbase FROM undo '
+                'WHERE height = ? AND amount IS NOT NULL', (height,)).fetchall()
+            created = self.db.execute(
+                'SELECT txid, idx FROM undo WHERE height = ? AND amount IS NULL', (height,)).fetchall()
+            if not spent and not created:
+                raise ValueError('no undo data for height {}'.format(height))
+            # restore first, outputs created and spent in the same block are removed after
+            self.db.executemany('INSERT INTO utxo VALUES (?, ?, ?, ?, ?, ?)', spent)
+            self.db.executemany('DELETE FROM utxo WHERE txid = ? AND idx = ?', created)
+            self.db.execute('DELETE FROM undo WHERE height = ?', (height,))
+            self.set_tip(height - 1)
@@ -0,0 +1,124 @@
+from unittest import TestCase
+
+from src.ecdsa.s256Ecc import PrivateKey
+from src.script.script import Script, p2pkh_script
+from src.tx.tx import Tx, TxIn, TxOut
+from src.utxo.utxo import UtxoStore
+
+
+class UtxoStoreTest(TestCase):
+
+    def setUp(self):
+        self.private_key = PrivateKey(secret=8675309)
+        self.script_pubkey = p2pkh_script(self.private_key.point.hash160())
+        self.store = UtxoStore()
+        # coinbase of height 1 pays two outputs to the key
+        self.coinbase = Tx(1, [TxIn(bytes(32), 0xffffffff, Script([b'\x01']))], [
+            TxOut(5000, self.script_pubkey),
+            TxOut(3000, self.script_pubkey),
+        ], 0)
+        self.store.apply_block([self.coinbase], 1)
+
+    def tearDown(self):
+        self.store.close()
+
+    def spend(self, outpoints, amount):
+        tx = Tx(1, [TxIn(txid, idx) for txid, idx in outpoints], [TxOut(amount, self.script_pubkey)], 0)
+        tx.prevout_source = self.store
+        for idx in range(len(outpoints)):
+            self.assertTrue(tx.sign_input(idx, self.private_key))
+        return tx
+
+    def test_get(self):
+        txid = self.coinbase.hash()
+        entry = self.store.get(txid, 1)
+        self.assertEqual(entry.amount, 3000)
+        self.assertEqual(entry.script_pubkey.serialize(), self.script_pubkey.serialize())
+        self.assertEqual(entry.height, 1)
+        self.assertTrue(entry.is_coinbase)
+        self.assertIsNone(self.store.get(txid, 2))
+        entries = self.store.get_many([(txid, 0), (txid, 1), (txid, 2), (bytes(32), 0)])
+        self.assertEqual(sorted(k[1] for k in entries), [0, 1])
+        self.assertIn((txid, 0), self.store)
+        self.assertEqual(len(self.store), 2)
+        with self.assertRaises(ValueError):
+            self.store.prevouts([(txid, 0), (txid, 2)])
+
+    def test_verify(self):
+        txid = self.coinbase.hash()
+        tx = self.spend([(txid, 0), (txid, 1)], 7000)
+        self.assertEqual(tx.fee(), 1000)
+        self.assertTrue(tx.verify())
+        tx.tx_outs[0].amount += 1
+        self.assertFalse(tx.verify_input(0))
+        # unknown or spent outputs fail verification
+        unknown = Tx(1, [TxIn(bytes(32), 0)], [TxOut(1000, self.script_pubkey)], 0)
+        unknown.prevout_source = self.store
+        self.assertFalse(unknown.verify())
+        self.assertFalse(unknown.verify_input(0))
+        tx = self.spend([(txid, 0)], 4000)
+        self.assertTrue(tx.verify())
+        self.store.apply_block([tx], 2)
+        self.assertFalse(tx.verify())
+
+    def test_change_source(self):
+        txid = self.coinbase.hash()
+        tx = self.spend([(txid, 0)], 4000)
+        self.assertEqual(tx.fee(), 1000)
+        with UtxoStore() as empty:
+            tx.prevout_source = empty
+            with self.assertRaises(ValueError):
+                tx.fee()
+        tx.prevout_source = self.store
+        self.assertEqual(tx.fee(), 1000)
+
+    def test_apply_undo(self):
+        txid = self.coinbase.hash()
+        tx = self.spend([(txid, 0)], 4000)
+        # output created and spent in the same block
+        child = Tx(1, [TxIn(tx.hash(), 0)], [TxOut(3500, self.script_pubkey)], 0)
+        self.store.apply_block([tx, child], 2)
+        self.assertIsNone(self.store.get(txid, 0))
+        self.assertIsNone(self.store.get(tx.hash(), 0))
+        self.assertEqual(self.store.get(child.hash(), 0).height, 2)
+        self.assertFalse(self.store.get(child.hash(), 0).is_coinbase)
+        self.assertEqual(len(self.store), 2)
+        # spent output can not be spent again, and nothing of the block is applied
+        again = self.spend([(txid, 1)], 2000)
+        again.tx_ins.append(TxIn(txid, 0))
+        with self.assertRaises(ValueError):
+            self.store.apply_block([again], 3)
+        self.assertIsNotNone(self.store.get(txid, 1))
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store.tip(), 2)
+        # only the tip can be undone
+        with self.assertRaises(ValueError):
+            self.store.undo_block(1)
+        self.store.undo_block(2)
+        self.assertEqual(self.store.tip(), 1)
+        self.assertEqual(self.store.get(txid, 0).amount, 5000)
+        self.assertIsNone(self.store.get(child.hash(), 0))
+        self.assertEqual(len(self.store), 2)
+        with self.assertRaises(ValueError):
+            self.store.undo_block(2)
+
+    def test_apply_order(self):
+        with self.assertRaises(ValueError):
+            self.store.apply_block([], 3)
+        with self.assertRaises(ValueError):
+            self.store.apply_block([], 1)
+        self.assertEqual(self.store.tip(), 1)
+        # duplicate coinbase does not replace the unspent outputs
+        with self.assertRaises(ValueError):
+            self.store.apply_block([self.coinbase], 2)
+        self.assertEqual(self.store.tip(), 1)
+        txid = self.coinbase.hash()
+        tx = self.spend([(txid, 0)], 4000)
+        self.store.apply_block([tx], 2)
+        with self.assertRaises(ValueError):
+            self.store.apply_block([self.coinbase], 3)
+        self.assertEqual(self.store.get(txid, 1).height, 1)
+        self.assertIsNone(self.store.get(txid, 0))
+        self.store.undo_block(2)
+        self.assertEqual(self.store.get(txid, 0).amount, 5000)
+        self.assertEqual(self.store.get(txid, 1).height, 1)